@@ -1,177 +1,442 @@
+import os
+import time
+from typing import Optional
+
 import dash
-from dash import dcc, html, Input, Output, State
-import plotly.express as px
-from weather_api import get_location_key_by_city_name, get_several_days_forecast_by_location_key
-
-app = dash.Dash(__name__)
-
-app.layout = html.Div([
-    html.H1("Прогноз погоды на маршруте", style={"textAlign": "center"}),
-
-    html.Div([
-        html.Label("Введите маршрут (разделяйте города запятыми):"),
-        dcc.Input(
-            id="route-input",
-            type="text",
-            placeholder="например: Москва, Санкт-Петербург, Казань",
-            style={"width": "60%"}
-        ),
-        html.Br(),
-        html.Label("Выбери продолжительность прогноза:"),
-        dcc.Dropdown(
-            id="forecast-duration",
-            options=[
-                {"label": "1 день", "value": 1},
-                {"label": "2 дня", "value": 2},
-                {"label": "3 дня", "value": 3},
-                {"label": "4 дня", "value": 4},
-                {"label": "5 дней", "value": 5},
-            ],
-            value=3,
-            style={"width": "30%"}
-        ),
-        html.Br(),
-        html.Label("Выберите параметры прогноза погоды, которые нужно отобразить:"),
-        dcc.Checklist(
-            id="weather-parameters",
-            options=[
-                {"label": "Температура (°C)", "value": "temperature"},
-                {"label": "Влажность (%)", "value": "humidity"},
-                {"label": "Скорость ветра (км/ч)", "value": "wind_speed"},
-                {"label": "Вероятность осадков (%)", "value": "precipitation_probability"},
-            ],
-            value=["temperature", "humidity", "wind_speed", "precipitation_probability"],
-            inline=True
-        ),
-        html.Br(),
-        html.Button("Получить прогноз!", id="submit-button", n_clicks=0),
-    ], style={"marginBottom": "20px"}),
-
-    html.Div(id="error-message", style={"color": "red", "textAlign": "center"}),
-
-    dcc.Graph(id="route-map"),
-    html.Div(id="forecast-graphs-container")
-])
-
-
-@app.callback(
-    [
-        Output("route-map", "figure"),
-        Output("forecast-graphs-container", "children"),
-        Output("error-message", "children"),
-    ],
-    [
-        Input("submit-button", "n_clicks")
-    ],
-    [
-        State("route-input", "value"),
-        State("forecast-duration", "value"),
-        State("weather-parameters", "value"),
-    ]
-)
-def update_forecast(n_clicks, route_input, forecast_duration, selected_parameters):
+import diskcache
+import flask
+from dash import dcc, html, ClientsideFunction, DiskcacheManager, Input, Output, State
+import numpy as np
+from departure_optimizer import leg_hours_by_distance, rank_departure_slots
+from metrics import QUOTA_REMAINING, STAGE_SECONDS, metrics
+from prefetch import LocationPopularity, PrefetchScheduler
+from profiling import is_profiling_requested, maybe_profile
+from route_densify import DEFAULT_CELL_SIZE_KM, densify_route, great_circle_distance
+from route_fetcher import fetch_points_forecasts, iter_route_forecasts
+from route_forecast import MAX_FORECAST_DAYS, PARAMETERS, RouteForecast
+from weather_api import WeatherApiConfig, WeatherService, default_service
+
+# Максимальное количество городов, прогнозы для которых запрашиваются одновременно
+FETCH_CONCURRENCY = 8
+# Как часто (в секундах) фоновая загрузка маршрута отправляет на страницу промежуточные результаты
+PROGRESS_INTERVAL = 0.5
+# Локальная очередь фоновых задач Dash, не требующая отдельного брокера
+BACKGROUND_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dash_background_cache")
+
+
+def build_layout() -> html.Div:
+    """
+    :return: Разметка страницы приложения
+    """
+    return html.Div([
+        # Адрес страницы нужен, чтобы включать профилирование callback-ов параметром ?profile=1
+        dcc.Location(id="url"),
+        html.H1("Прогноз погоды на маршруте", style={"textAlign": "center"}),
+
+        html.Div([
+            html.Label("Введите маршрут (разделяйте города запятыми):"),
+            dcc.Input(
+                id="route-input",
+                type="text",
+                placeholder="например: Москва, Санкт-Петербург, Казань",
+                list="city-suggestions",
+                autoComplete="off",
+                style={"width": "60%"}
+            ),
+            # Подсказки названий городов из локального справочника для поля ввода маршрута
+            html.Datalist(id="city-suggestions"),
+            html.Br(),
+            html.Label("Выбери продолжительность прогноза:"),
+            dcc.Dropdown(
+                id="forecast-duration",
+                options=[
+                    {"label": "1 день", "value": 1},
+                    {"label": "2 дня", "value": 2},
+                    {"label": "3 дня", "value": 3},
+                    {"label": "4 дня", "value": 4},
+                    {"label": "5 дней", "value": 5},
+                ],
+                value=3,
+                style={"width": "30%"}
+            ),
+            html.Br(),
+            html.Label("Выберите параметры прогноза погоды, которые нужно отобразить:"),
+            dcc.Checklist(
+                id="weather-parameters",
+                options=[
+                    {"label": "Температура (°C)", "value": "temperature"},
+                    {"label": "Влажность (%)", "value": "humidity"},
+                    {"label": "Скорость ветра (км/ч)", "value": "wind_speed"},
+                    {"label": "Вероятность осадков (%)", "value": "precipitation_probability"},
+                ],
+                value=["temperature", "humidity", "wind_speed", "precipitation_probability"],
+                inline=True
+            ),
+            html.Br(),
+            html.Label("Шаг промежуточных точек между городами в км (оставьте пустым, чтобы не добавлять точки):"),
+            dcc.Input(
+                id="sample-spacing",
+                type="number",
+                min=10,
+                placeholder="например: 50",
+                style={"width": "15%"}
+            ),
+            html.Br(),
+            html.Button("Получить прогноз!", id="submit-button", n_clicks=0),
+            html.Button("Отменить", id="cancel-button", n_clicks=0, disabled=True),
+        ], style={"marginBottom": "20px"}),
+
+        html.Div([
+            html.Progress(id="route-progress", value="0", max="1"),
+            html.Span(id="route-progress-text", style={"marginLeft": "10px"}),
+        ], id="route-progress-container", style={"display": "none"}),
+
+        html.Div("Введите маршрут для отображения графиков прогноза погоды.",
+                 id="error-message", style={"color": "red", "textAlign": "center"}),
+        # Лучший день выезда по прогнозу погоды на всём маршруте
+        html.Div(id="departure-advice", style={"textAlign": "center", "fontWeight": "bold"}),
+
+        # Загруженные прогнозы маршрута: смена параметров и продолжительности прогноза
+        # перерисовывает графики по этим данным без новых запросов к API
+        dcc.Store(id="route-store"),
+        # Промежуточные результаты загрузки, которые показываются, пока маршрут загружается
+        dcc.Store(id="route-progress-store"),
+
+        # Карта и графики маршрута за все дни и со всеми параметрами: выбранные дни и параметры
+        # оставляет в браузере assets/figures.js
+        dcc.Store(id="figure-store"),
+
+        dcc.Graph(id="route-map"),
+        html.Div(dcc.Graph(id="forecast-graph", style={"display": "none"}), id="forecast-graphs-container")
+    ])
+
+
+def add_route_samples(fetched: list, spacing_km: float, service: Optional[WeatherService] = None) -> tuple:
+    """
+    Добавляет между городами маршрута промежуточные точки с прогнозом погоды
+
+    :param fetched: Результаты получения прогноза для городов маршрута
+    :param spacing_km: Шаг промежуточных точек в километрах
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Кортеж (результаты для всех точек в порядке маршрута, индексы городов среди них,
+        количество промежуточных точек, для которых не удалось получить прогноз)
+    """
+    legs = densify_route([result.geo_data["latitude"] for result in fetched],
+                         [result.geo_data["longitude"] for result in fetched], spacing_km)
+    names, latitudes, longitudes = [], [], []
+    for result, (leg_latitudes, leg_longitudes) in zip(fetched, legs):
+        distances = great_circle_distance(result.geo_data["latitude"], result.geo_data["longitude"],
+                                          leg_latitudes, leg_longitudes)
+        names.extend(f"{result.city} + {distance:.0f} км" for distance in distances)
+        latitudes.extend(leg_latitudes)
+        longitudes.extend(leg_longitudes)
+    # Ячейка сетки не меньше шага, иначе каждая промежуточная точка оказывается в своей ячейке
+    # и запрашивается у API отдельно
+    samples = iter(fetch_points_forecasts(names, latitudes, longitudes, max_workers=FETCH_CONCURRENCY,
+                                          cell_size_km=max(DEFAULT_CELL_SIZE_KM, spacing_km), service=service))
+
+    all_points = []
+    city_indices = []
+    failed_points = 0
+    for result, (leg_latitudes, _) in zip(fetched, legs + [(np.empty(0), None)]):
+        city_indices.append(len(all_points))
+        all_points.append(result)
+        for _ in range(len(leg_latitudes)):
+            sample = next(samples)
+            if sample.error:
+                failed_points += 1
+            else:
+                all_points.append(sample)
+    return all_points, city_indices, failed_points
+
+
+def build_route_data(fetched: list, city_indices: list, submission: int) -> dict:
+    """
+    Собирает данные для route-store из результатов загрузки прогнозов
+
+    Прогноз всегда сохраняется на 5 дней, чтобы смена продолжительности не требовала запросов
+
+    :param fetched: Успешные результаты загрузки прогнозов в порядке маршрута
+    :param city_indices: Индексы введённых городов среди всех точек маршрута
+    :param submission: Номер отправки формы, по которому отличаются данные разных запусков
+    :return: Словарь с прогнозом маршрута
+    """
+    with metrics.timer(STAGE_SECONDS, stage="route_data"):
+        route_forecast = RouteForecast.from_payloads(
+            [result.city for result in fetched],
+            [result.geo_data["latitude"] for result in fetched],
+            [result.geo_data["longitude"] for result in fetched],
+            [result.forecast_payload for result in fetched],
+            days=MAX_FORECAST_DAYS,
+        )
+        route_data = route_forecast.to_dict()
+    route_data["city_indices"] = city_indices
+    route_data["submission"] = submission
+    return route_data
+
+
+def suggest_cities(route_input, service: Optional[WeatherService] = None):
+    """
+    Подсказывает названия для последнего города в маршруте по локальному справочнику городов
+
+    Каждая подсказка содержит весь маршрут, чтобы выбор подсказки заменял только последний город
+    """
+    gazetteer = (service or default_service()).gazetteer
+    if not route_input or gazetteer is None:
+        return []
+    *previous_cities, last_city = route_input.split(",")
+    if not last_city.strip():
+        return []
+    route_prefix = "".join(f"{city.strip()}, " for city in previous_cities)
+    return [html.Option(value=route_prefix + entry.name) for entry in gazetteer.suggest(last_city)]
+
+
+def update_forecast(set_progress, n_clicks, route_input, sample_spacing=None, url_search=None,
+                    service: Optional[WeatherService] = None, popularity: Optional[LocationPopularity] = None):
+    """
+    Загружает пятидневные прогнозы для всех точек маршрута и сохраняет их в route-store
+
+    Выполняется как фоновый callback: по мере загрузки городов промежуточные результаты
+    отправляются в route-progress-store, чтобы карта и графики появлялись постепенно
+    """
+    try:
+        with maybe_profile(is_profiling_requested(url_search), "update_forecast"), \
+                metrics.timer(STAGE_SECONDS, stage="update_forecast"):
+            return load_route(set_progress, n_clicks, route_input, sample_spacing, service, popularity)
+    finally:
+        # Фоновая задача выполняется в отдельном процессе, который завершается без atexit,
+        # поэтому накопленные метрики записываются сразу
+        metrics.flush()
+
+
+def load_route(set_progress, n_clicks: int, route_input: str, sample_spacing: float = None,
+               service: Optional[WeatherService] = None, popularity: Optional[LocationPopularity] = None) -> tuple:
+    """
+    Загружает прогнозы для маршрута, введённого пользователем
+
+    :param set_progress: Функция, которая отправляет на страницу промежуточные результаты
+    :param n_clicks: Номер отправки формы
+    :param route_input: Введённый маршрут (города через запятую)
+    :param sample_spacing: Шаг промежуточных точек в километрах (None - без промежуточных точек)
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :param popularity: Популярность локаций для планировщика обновлений (None - не учитывать запрос)
+    :return: Кортеж (данные для route-store, сообщение об ошибках)
+    """
     if n_clicks == 0 or not route_input:
-        return {}, {}, "Введите маршрут для отображения графиков прогноза погоды."
+        return None, "Введите маршрут для отображения графиков прогноза погоды."
 
     cities = [city.strip() for city in route_input.split(",")]
     if not cities:
-        return {}, {}, "Пожалуйста, введите хотя бы один город."
-
-    all_weather_data = []
-    map_points = []
-
-    parameter_display_names = {
-        "temperature": "Температура (°C)",
-        "humidity": "Влажность (%)",
-        "wind_speed": "Скорость ветра (км/ч)",
-        "precipitation_probability": "Вероятность осадков (%)",
-    }
-
-    size_arg_priority = ["humidity", "wind_speed", "precipitation_probability"]
-    size_arg = None
-    for arg in size_arg_priority:
-        if arg in selected_parameters:
-            size_arg = parameter_display_names[arg]
-            break
-
-    route_coords = []
-    for city in cities:
-        result_location_key = get_location_key_by_city_name(city, return_geo=True)
-        if not result_location_key:
-            return {}, {}, f"Не смог получить ключ локации для города {city}."
-        location_key, geo_data = result_location_key
-        if not location_key:
-            return {}, {}, f"Не смог получить ключ локации для города {city}."
-
-        weather_data = get_several_days_forecast_by_location_key(location_key, days=forecast_duration)
-        if not weather_data:
-            return {}, {}, f"Не смог получить данные о погоде для города {city}."
-
-        all_weather_data.append((city, weather_data, geo_data))
-        route_coords.append((geo_data["latitude"], geo_data["longitude"]))
-        map_points.append({
-            "Город": city,
-            "lat": geo_data["latitude"],
-            "lon": geo_data["longitude"],
-            "Температура (°C)": round(weather_data[0]["temperature"], 2),
-            "Влажность (%)": round(weather_data[0]["humidity"], 2),
-            "Скорость ветра (км/ч)": round(weather_data[0]["wind_speed"], 2),
-            "Вероятность осадков (%)": round(weather_data[0]["precipitation_probability"], 2),
-        })
-
-    map_figure = px.scatter_mapbox(
-        map_points,
-        lat="lat",
-        lon="lon",
-        hover_name="Город",
-        hover_data={parameter_display_names[param]: True for param in selected_parameters},
-        color="Температура (°C)",
-        size=size_arg,
-        size_max=20,
-        zoom=4,
-        title="Маршрутная карта с данными о погоде (наведись на город, чтобы увидеть прогноз)",
-    )
+        return None, "Пожалуйста, введите хотя бы один город."
 
-    # Добавляем линию маршрута на карту
-    route_line = {
-        "type": "scattermapbox",
-        "lat": [coord[0] for coord in route_coords],
-        "lon": [coord[1] for coord in route_coords],
-        "mode": "lines",
-        "line": {"width": 3, "color": "blue"},
-        "name": "Route",
-    }
-    map_figure.add_trace(route_line)
-
-    map_figure.update_layout(mapbox_style="open-street-map",
-                             showlegend=False)
-
-    # Строим графики с параметрами погоды
-    forecast_graphs = []
-    for param in selected_parameters:
-        forecast_data = []
-        for city, weather_data, _ in all_weather_data:
-            for day, daily_forecast in enumerate(weather_data, start=1):
-                forecast_data.append({
-                    "Город": city,
-                    "День": f"День {day}",
-                    "Значение": daily_forecast[param],
-                })
-
-        forecast_graph = px.line(
-            forecast_data,
-            x="День",
-            y="Значение",
-            color="Город",
-            labels={"Значение": parameter_display_names[param]},
-            title=f"Параметр прогноза погоды: {parameter_display_names[param]}",
-            markers=True,
-        )
+    results = [None] * len(cities)
+    last_progress = time.monotonic()
+    for done, (index, result) in enumerate(iter_route_forecasts(cities, FETCH_CONCURRENCY, service), start=1):
+        results[index] = result
+        if done < len(cities) and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            partial = [result for result in results if result and not result.error]
+            partial_data = build_route_data(partial, list(range(len(partial))), n_clicks) if partial else None
+            set_progress((partial_data, str(done), str(len(cities)), f"Получены прогнозы: {done} из {len(cities)}"))
+            last_progress = time.monotonic()
+
+    fetched = []
+    error_messages = []
+    for result in results:
+        if result.error:
+            error_messages.append(result.error)
+            continue
+        fetched.append(result)
+
+    if not fetched:
+        return None, " ".join(error_messages)
+
+    # Индексы введённых городов среди всех точек маршрута
+    city_indices = list(range(len(fetched)))
+    if sample_spacing and len(fetched) > 1:
+        fetched, city_indices, failed_points = add_route_samples(fetched, sample_spacing, service)
+        if failed_points:
+            error_messages.append(f"Не смог получить данные о погоде для {failed_points} промежуточных точек.")
+
+    if popularity is not None:
+        # Популярные локации планировщик обновляет заранее, чтобы следующие запросы брали прогноз из кэша
+        popularity.record([result.location_key for result in fetched])
+    return build_route_data(fetched, city_indices, n_clicks), " ".join(error_messages)
+
+
+def describe_best_departure(route_forecast: RouteForecast) -> str:
+    """
+    Подбирает день выезда с наименьшим риском плохой погоды на маршруте. Время в пути
+    по каждому отрезку оценивается по расстоянию между точками и средней скорости
+
+    :param route_forecast: Прогноз погоды для всех точек маршрута
+    :return: Текст с лучшим днём выезда
+    """
+    leg_hours = leg_hours_by_distance(route_forecast.latitudes, route_forecast.longitudes)
+    slots = rank_departure_slots(route_forecast.values, leg_hours, top=1)
+    if not slots:
+        return "Маршрут не укладывается в окно прогноза, поэтому лучший день выезда не определён."
+    best = slots[0]
+    advice = f"Лучший день выезда: День {best.day}"
+    if len(leg_hours):
+        advice += f" (отрезков маршрута с плохой погодой: {best.bad_legs} из {len(leg_hours)})"
+    return advice
+
+
+def render_forecast(route_data, progress_data=None, url_search=None):
+    """
+    Строит карту и графики по уже загруженным прогнозам, не обращаясь к API
+
+    Выполняется только при загрузке нового маршрута: выбор продолжительности прогноза
+    и параметров погоды применяется к построенным фигурам в браузере (assets/figures.js).
+    Пока идёт загрузка нового маршрута, показываются его промежуточные результаты
+    """
+    with maybe_profile(is_profiling_requested(url_search), "render_forecast"), \
+            metrics.timer(STAGE_SECONDS, stage="render_forecast"):
+        return draw_route(route_data, progress_data)
+
+
+def draw_route(route_data: dict, progress_data: dict = None) -> tuple:
+    """
+    :param route_data: Данные из route-store
+    :param progress_data: Промежуточные результаты загрузки из route-progress-store
+    :return: Кортеж (фигуры карты и графиков за все дни и со всеми параметрами для figure-store,
+        лучший день выезда)
+    """
+    if progress_data and (not route_data or progress_data["submission"] > route_data["submission"]):
+        route_data = progress_data
+    if not route_data:
+        return None, ""
+    route_forecast = RouteForecast.from_dict(route_data)
+    # День выезда подбирается по всему окну прогноза, независимо от выбранной продолжительности
+    departure_advice = describe_best_departure(route_forecast)
+    city_forecast = route_forecast.take(route_data["city_indices"])
+
+    # plotly импортируется при первой отрисовке, а не при запуске приложения
+    from figures import build_forecast_figure, build_route_map
+
+    with metrics.timer(STAGE_SECONDS, stage="figure_building"):
+        figures = {
+            "map": build_route_map(route_forecast, PARAMETERS),
+            "forecast": build_forecast_figure(city_forecast, PARAMETERS),
+        }
+    return figures, departure_advice
 
-        forecast_graphs.append(dcc.Graph(figure=forecast_graph))
 
-    return map_figure, forecast_graphs, ""
+def metrics_endpoint(service: Optional[WeatherService] = None):
+    """
+    Метрики приложения в текстовом формате Prometheus
+    """
+    quota_remaining = (service or default_service()).quota_remaining()
+    if quota_remaining is not None:
+        metrics.set_gauge(QUOTA_REMAINING, quota_remaining)
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def create_app(config: Optional[WeatherApiConfig] = None, background_cache_dir: str = BACKGROUND_CACHE_DIR,
+               start_prefetch: bool = True, service: Optional[WeatherService] = None) -> dash.Dash:
+    """
+    Создаёт приложение Dash: разметку, callback-и и маршрут /metrics
+
+    Приложение работает со своим сервисом AccuWeather (HTTP-клиентом, квотой и кэшами),
+    поэтому несколько приложений в одном процессе не влияют друг на друга
+
+    :param config: Настройки доступа к AccuWeather, по которым создаётся сервис приложения
+        (по умолчанию используется weather_api.default_service())
+    :param background_cache_dir: Папка очереди фоновых задач
+    :param start_prefetch: Запустить планировщик, который заранее обновляет прогнозы популярных локаций
+    :param service: Готовый сервис AccuWeather вместо создания по config
+    :return: Приложение Dash
+    """
+    if service is None:
+        service = WeatherService(config) if config is not None else default_service()
+    popularity = LocationPopularity(service.config.db_path)
+
+    # Callback-и получают сервис приложения через замыкания: Dash определяет фоновые callback-и
+    # по исходному коду функции, поэтому functools.partial здесь не подходит
+    def suggest_cities_callback(route_input):
+        return suggest_cities(route_input, service)
+
+    def update_forecast_callback(set_progress, n_clicks, route_input, sample_spacing=None, url_search=None):
+        return update_forecast(set_progress, n_clicks, route_input, sample_spacing, url_search, service, popularity)
+
+    def metrics_view():
+        return metrics_endpoint(service)
+
+    background_callback_manager = DiskcacheManager(diskcache.Cache(background_cache_dir))
+    app = dash.Dash(__name__, background_callback_manager=background_callback_manager)
+    app.layout = build_layout()
+
+    app.callback(
+        Output("city-suggestions", "children"),
+        Input("route-input", "value"),
+        prevent_initial_call=True,
+    )(suggest_cities_callback)
+
+    app.callback(
+        [
+            Output("route-store", "data"),
+            Output("error-message", "children"),
+        ],
+        [
+            Input("submit-button", "n_clicks")
+        ],
+        [
+            State("route-input", "value"),
+            State("sample-spacing", "value"),
+            State("url", "search"),
+        ],
+        background=True,
+        progress=[
+            Output("route-progress-store", "data"),
+            Output("route-progress", "value"),
+            Output("route-progress", "max"),
+            Output("route-progress-text", "children"),
+        ],
+        # После завершения или отмены загрузки промежуточные результаты сбрасываются,
+        # чтобы на странице не остался недогруженный маршрут
+        progress_default=[None, "0", "1", ""],
+        running=[
+            (Output("cancel-button", "disabled"), False, True),
+            (Output("route-progress-container", "style"), {"display": "block"}, {"display": "none"}),
+        ],
+        # Новый запуск по кнопке отправки сам отменяет предыдущую задачу, а кнопка отмены - текущую
+        cancel=[Input("cancel-button", "n_clicks")],
+        prevent_initial_call=True,
+    )(update_forecast_callback)
+
+    app.callback(
+        [
+            Output("figure-store", "data"),
+            Output("departure-advice", "children"),
+        ],
+        [
+            Input("route-store", "data"),
+            Input("route-progress-store", "data"),
+        ],
+        [
+            State("url", "search"),
+        ]
+    )(render_forecast)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace="route_weather", function_name="render_figures"),
+        [
+            Output("route-map", "figure"),
+            Output("forecast-graph", "figure"),
+            Output("forecast-graph", "style"),
+        ],
+        [
+            Input("figure-store", "data"),
+            Input("forecast-duration", "value"),
+            Input("weather-parameters", "value"),
+        ],
+    )
+
+    app.server.add_url_rule("/metrics", view_func=metrics_view)
+    if start_prefetch:
+        PrefetchScheduler(popularity, service).start()
+    return app
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    create_app().run_server(debug=True)
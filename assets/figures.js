@@ -0,0 +1,125 @@
+// Отрисовка графиков в браузере: смена продолжительности прогноза и параметров погоды
+// не требует запроса к серверу. Сервер один раз на маршрут строит фигуры за все дни
+// и со всеми параметрами (app.draw_route в callback-е render_forecast), а здесь из них оставляются
+// выбранные дни и параметры.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    route_weather: {
+        render_figures: function (figures, forecastDuration, selectedParameters) {
+            if (!figures) {
+                return [{}, {}, {display: "none"}];
+            }
+            var selected = selectedParameters || [];
+            var forecast = selectForecast(figures.forecast, forecastDuration || 1, selected);
+            return [
+                selectMapParameters(figures.map, selected),
+                forecast || {},
+                forecast ? {display: "block"} : {display: "none"},
+            ];
+        }
+    }
+});
+
+function copyFigure(figure) {
+    return JSON.parse(JSON.stringify(figure));
+}
+
+// Подсказки и размер маркеров карты для выбранных параметров, как в figures.build_route_map
+function selectMapParameters(mapFigure, selected) {
+    var figure = copyFigure(mapFigure);
+    var meta = figure.layout.meta;
+    var trace = figure.data[0];
+    var lines = selected
+        .filter(function (param) { return meta.parameters.indexOf(param) >= 0; })
+        .map(function (param) {
+            return meta.display_names[param] + ": %{customdata[" + meta.parameters.indexOf(param) + "]}<br>";
+        });
+    trace.hovertemplate = "<b>%{text}</b><br>" + lines.join("") + "%{hovertext}<extra></extra>";
+
+    var sizeParameter = meta.size_priority.find(function (param) {
+        return selected.indexOf(param) >= 0 && meta.parameters.indexOf(param) >= 0;
+    });
+    delete trace.marker.size;
+    delete trace.marker.sizemode;
+    delete trace.marker.sizemin;
+    delete trace.marker.sizeref;
+    if (sizeParameter) {
+        var column = meta.parameters.indexOf(sizeParameter);
+        var sizes = trace.customdata.map(function (row) {
+            var value = row[column];
+            return value === null || isNaN(value) ? 0 : value;
+        });
+        Object.assign(trace.marker, {
+            size: sizes,
+            sizemode: "area",
+            sizemin: 2,
+            sizeref: 2 * Math.max(Math.max.apply(null, sizes), 1) / Math.pow(meta.max_marker_size, 2),
+        });
+    }
+    return figure;
+}
+
+// Графики выбранных параметров за первые forecastDuration дней, как в figures.build_forecast_figure
+function selectForecast(forecastFigure, forecastDuration, selected) {
+    var axisSuffix = {};
+    forecastFigure.data.forEach(function (trace) {
+        axisSuffix[trace.meta] = trace.yaxis.slice(1);
+    });
+    var rows = selected.filter(function (param) { return param in axisSuffix; });
+    if (!rows.length) {
+        return null;
+    }
+
+    var layout = copyFigure(forecastFigure.layout);
+    var spacing = layout.meta.vertical_spacing;
+    var height = (1 - spacing * (rows.length - 1)) / rows.length;
+    Object.keys(axisSuffix).forEach(function (param) {
+        if (rows.indexOf(param) < 0) {
+            delete layout["xaxis" + axisSuffix[param]];
+            delete layout["yaxis" + axisSuffix[param]];
+        }
+    });
+    layout.annotations = (layout.annotations || []).filter(function (annotation) {
+        return rows.indexOf(annotation.name) >= 0;
+    });
+    rows.forEach(function (param, row) {
+        var top = 1 - row * (height + spacing);
+        var xaxis = layout["xaxis" + axisSuffix[param]];
+        var days = xaxis.tickvals.filter(function (day) { return day <= forecastDuration; });
+        layout["yaxis" + axisSuffix[param]].domain = [Math.max(top - height, 0), top];
+        // Ось нижнего графика могла быть скрыта, поэтому общая ось дней назначается заново
+        var bottomAxis = "x" + axisSuffix[rows[rows.length - 1]];
+        if (row === rows.length - 1) {
+            delete xaxis.matches;
+        } else {
+            xaxis.matches = bottomAxis;
+        }
+        xaxis.showticklabels = row === rows.length - 1;
+        xaxis.tickvals = days;
+        xaxis.ticktext = xaxis.ticktext.slice(0, days.length);
+        xaxis.range = [0.5, days.length + 0.5];
+        layout.annotations.forEach(function (annotation) {
+            if (annotation.name === param) {
+                annotation.y = top;
+            }
+        });
+    });
+    layout.height = layout.meta.subplot_height * rows.length + 60;
+
+    var data = forecastFigure.data
+        .filter(function (trace) { return rows.indexOf(trace.meta) >= 0; })
+        .map(function (trace) {
+            var keep = trace.x.map(function (day) { return day === null || day <= forecastDuration; });
+            var sliced = Object.assign({}, trace);
+            ["x", "y", "text"].forEach(function (key) {
+                if (Array.isArray(trace[key])) {
+                    sliced[key] = trace[key].filter(function (_, i) { return keep[i]; });
+                }
+            });
+            // Легенда городов показывается у первого из выбранных графиков
+            if (trace.legendgroup) {
+                sliced.showlegend = trace.meta === rows[0];
+            }
+            return sliced;
+        });
+    return {data: data, layout: layout};
+}
@@ -0,0 +1,308 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from dataclasses import dataclass
+from itertools import islice
+from typing import Optional
+
+from weather_api import ApiKeyNotFoundError, WeatherService, default_service
+from geo_cache import normalize_city_name
+from metrics import metrics
+from route_fetcher import DEFAULT_MAX_WORKERS, fetch_route_forecasts
+from route_forecast import MAX_FORECAST_DAYS, PARAMETERS, RouteForecast
+
+# Количество маршрутов, которые обрабатываются и записываются за один шаг
+DEFAULT_CHUNK_SIZE = 500
+# Колонки результата: одна строка на точку маршрута и день прогноза
+RESULT_COLUMNS = ("route_id", "point_index", "city", "latitude", "longitude", "day",
+                  *PARAMETERS, "bad_weather", "error")
+
+
+@dataclass
+class BatchRoute:
+    """
+    Маршрут из входного файла пакетной обработки
+
+    - route_id - Идентификатор маршрута из файла (или номер строки, если его нет)
+
+    - cities - Названия городов в порядке маршрута
+    """
+    route_id: str
+    cities: list
+
+
+def read_routes(path: str):
+    """
+    Читает маршруты из файла JSONL или CSV по одному, не загружая файл в память целиком
+
+    В JSONL каждая строка - объект с полями route_id и cities (список городов)
+    или route (города через запятую). В CSV - колонки route_id и route (или cities).
+    Поле cities, заданное строкой, тоже разбивается на города по запятым.
+
+    :param path: Путь к файлу с маршрутами
+    :return: Генератор маршрутов BatchRoute
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            records = csv.DictReader(file)
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+        for number, record in enumerate(records, start=1):
+            cities = record.get("cities")
+            if cities is None:
+                cities = record.get("route") or ""
+            if isinstance(cities, str):
+                cities = cities.split(",")
+            cities = [city.strip() for city in cities if city.strip()]
+            yield BatchRoute(str(record.get("route_id") or record.get("id") or number), cities)
+
+
+def process_routes(routes: list, days: int = MAX_FORECAST_DAYS, max_workers: int = DEFAULT_MAX_WORKERS,
+                   service: Optional[WeatherService] = None) -> list:
+    """
+    Получает прогнозы для группы маршрутов и строит строки результата
+
+    Города, которые встречаются в нескольких маршрутах группы, запрашиваются один раз,
+    а между группами повторные запросы не выполняются благодаря кэшам weather_api
+
+    :param routes: Маршруты BatchRoute
+    :param days: Количество дней прогноза
+    :param max_workers: Максимальное количество одновременных запросов
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Список строк результата в порядке колонок RESULT_COLUMNS
+    """
+    unique_cities = {}
+    for route in routes:
+        for city in route.cities:
+            unique_cities.setdefault(normalize_city_name(city), city)
+    results = dict(zip(unique_cities, fetch_route_forecasts(list(unique_cities.values()), max_workers, service)))
+
+    fetched = [result for result in results.values() if not result.error]
+    route_forecast = RouteForecast.from_payloads(
+        [result.city for result in fetched],
+        [result.geo_data["latitude"] for result in fetched],
+        [result.geo_data["longitude"] for result in fetched],
+        [result.forecast_payload for result in fetched],
+        days=days,
+    )
+    values = route_forecast.values.round(2).tolist()
+    bad_weather = route_forecast.bad_weather_mask().tolist()
+    city_index = {normalize_city_name(result.city): i for i, result in enumerate(fetched)}
+
+    rows = []
+    for route in routes:
+        for point_index, city in enumerate(route.cities):
+            name = normalize_city_name(city)
+            i = city_index.get(name)
+            if i is None:
+                rows.append((route.route_id, point_index, city, None, None, None,
+                             *[None] * len(PARAMETERS), None, results[name].error))
+                continue
+            latitude = round(float(route_forecast.latitudes[i]), 6)
+            longitude = round(float(route_forecast.longitudes[i]), 6)
+            for day in range(route_forecast.days):
+                rows.append((route.route_id, point_index, city, latitude, longitude, day + 1,
+                             *[None if math.isnan(value) else value for value in values[i][day]],
+                             bad_weather[i][day], None))
+    return rows
+
+
+class CsvResultWriter:
+    """
+    Дописывает строки результата в CSV-файл
+
+    position - размер файла после последней записанной группы; при продолжении
+    с контрольной точки файл обрезается до него, чтобы убрать строки незавершённой группы
+    """
+
+    def __init__(self, path: str, position: int = 0):
+        self.path = path
+        mode = "r+" if position else "w"
+        self._file = open(path, mode, encoding="utf-8", newline="")
+        self._file.seek(position)
+        self._file.truncate()
+        self._writer = csv.writer(self._file)
+        if not position:
+            self._writer.writerow(RESULT_COLUMNS)
+
+    def write(self, rows: list) -> None:
+        self._writer.writerows(rows)
+
+    def commit(self) -> int:
+        """
+        :return: Позиция в файле, до которой записанные строки сохранены на диск
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Записывает каждую группу строк результата в отдельный файл part-NNNNN.parquet в папке path
+
+    Папку целиком можно прочитать, например, через pandas.read_parquet(path).
+    Требует установленного пакета pyarrow.
+    """
+
+    def __init__(self, path: str, position: int = 0):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.position = position
+        self._schema = pa.schema(
+            [("route_id", pa.string()), ("point_index", pa.int32()), ("city", pa.string()),
+             ("latitude", pa.float64()), ("longitude", pa.float64()), ("day", pa.int8())]
+            + [(param, pa.float64()) for param in PARAMETERS]
+            + [("bad_weather", pa.bool_()), ("error", pa.string())]
+        )
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows: list) -> None:
+        columns = list(zip(*rows)) if rows else [()] * len(RESULT_COLUMNS)
+        table = self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+        self._pq.write_table(table, os.path.join(self.path, f"part-{self.position:05d}.parquet"))
+        self.position += 1
+
+    def commit(self) -> int:
+        """
+        :return: Номер следующего файла группы
+        """
+        return self.position
+
+    def close(self) -> None:
+        pass
+
+
+WRITERS = {"csv": CsvResultWriter, "parquet": ParquetResultWriter}
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    :param path: Путь к файлу контрольной точки
+    :return: Состояние обработки либо пустой словарь, если контрольной точки нет
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    # Файл заменяется целиком, чтобы при сбое не осталось наполовину записанной контрольной точки
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, ensure_ascii=False)
+    os.replace(temporary_path, path)
+
+
+def is_quota_exhausted(service: WeatherService) -> bool:
+    remaining = service.quota_remaining()
+    return remaining is not None and remaining < 1
+
+
+def run_batch(input_path: str, output_path: str, output_format: str = "csv", days: int = MAX_FORECAST_DAYS,
+              chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = DEFAULT_MAX_WORKERS,
+              resume: bool = False, checkpoint_path: str = None, service: Optional[WeatherService] = None) -> dict:
+    """
+    Рассчитывает погоду для всех маршрутов из файла и записывает результат по группам маршрутов
+
+    В памяти одновременно находится только одна группа из chunk_size маршрутов. После записи
+    каждой группы сохраняется контрольная точка, с которой обработку можно продолжить (resume=True).
+    Если квота API исчерпана, обработка останавливается до записи группы, в которой были ошибки,
+    чтобы при продолжении эти маршруты были обработаны заново.
+
+    :param input_path: Файл с маршрутами (JSONL или CSV)
+    :param output_path: CSV-файл или папка для файлов Parquet
+    :param output_format: Формат результата: csv или parquet
+    :param days: Количество дней прогноза
+    :param chunk_size: Количество маршрутов в одной группе
+    :param max_workers: Максимальное количество одновременных запросов
+    :param resume: Продолжить с контрольной точки
+    :param checkpoint_path: Файл контрольной точки (по умолчанию - рядом с результатом)
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Состояние обработки: количество обработанных маршрутов и строк, признак остановки из-за квоты
+    :raises ApiKeyNotFoundError: Если API-ключ не задан
+    """
+    service = service or default_service()
+    # Без ключа все запросы завершились бы ошибкой, поэтому обработка не начинается
+    service.api_key()
+    checkpoint_path = checkpoint_path or f"{output_path.rstrip(os.sep)}.checkpoint.json"
+    state = load_checkpoint(checkpoint_path) if resume else {}
+    if state and (state["input"] != os.path.abspath(input_path) or state["format"] != output_format):
+        raise ValueError(f"Контрольная точка {checkpoint_path} относится к другому входному файлу или формату")
+    if state and not os.path.exists(output_path):
+        print(f"Результат {output_path} не найден, обработка начинается заново", file=sys.stderr)
+        state = {}
+    state = state or {"input": os.path.abspath(input_path), "format": output_format,
+                      "routes_done": 0, "rows_written": 0, "position": 0}
+    state["quota_exhausted"] = False
+
+    writer = WRITERS[output_format](output_path, state["position"])
+    routes = islice(read_routes(input_path), state["routes_done"], None)
+    try:
+        while True:
+            chunk = list(islice(routes, chunk_size))
+            if not chunk:
+                break
+            rows = process_routes(chunk, days, max_workers, service)
+            if any(row[-1] for row in rows) and is_quota_exhausted(service):
+                print("Квота запросов к API исчерпана, продолжите обработку позже с флагом --resume", file=sys.stderr)
+                state["quota_exhausted"] = True
+                break
+            writer.write(rows)
+            state["position"] = writer.commit()
+            state["routes_done"] += len(chunk)
+            state["rows_written"] += len(rows)
+            save_checkpoint(checkpoint_path, state)
+            print(f"Обработано маршрутов: {state['routes_done']}", file=sys.stderr)
+    finally:
+        writer.close()
+        metrics.flush()
+    return state
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетный расчёт погоды для маршрутов из файла")
+    parser.add_argument("input", help="Файл с маршрутами: JSONL (поля route_id, cities или route) "
+                                      "или CSV (колонки route_id, route)")
+    parser.add_argument("output", help="CSV-файл или папка для файлов Parquet")
+    parser.add_argument("--format", choices=sorted(WRITERS), default=None,
+                        help="Формат результата (по умолчанию - по расширению output)")
+    parser.add_argument("--days", type=int, default=MAX_FORECAST_DAYS, choices=range(1, MAX_FORECAST_DAYS + 1))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Количество маршрутов, обрабатываемых за один шаг")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Максимальное количество одновременных запросов к API")
+    parser.add_argument("--resume", action="store_true", help="Продолжить с последней контрольной точки")
+    parser.add_argument("--checkpoint", default=None, help="Файл контрольной точки")
+    args = parser.parse_args()
+
+    output_format = args.format or ("parquet" if args.output.rstrip(os.sep).endswith(".parquet") else "csv")
+    try:
+        state = run_batch(args.input, args.output, output_format, args.days, args.chunk_size, args.workers,
+                          args.resume, args.checkpoint)
+    except ImportError:
+        print("Для записи в Parquet установите пакет pyarrow", file=sys.stderr)
+        return 2
+    except (ApiKeyNotFoundError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"Маршрутов: {state['routes_done']}, строк: {state['rows_written']}")
+    return 3 if state["quota_exhausted"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from plotly.utils import PlotlyJSONEncoder
+
+import weather_api
+from weather_api import WeatherApiConfig, WeatherService
+from fake_accuweather import FakeAccuWeather
+from http_client import ApiClient, QuotaLimiter
+from metrics import metrics
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES = (1, 10, 100, 1000)
+# Допустимое ухудшение p95 относительно базовых замеров, прежде чем считать его регрессией
+DEFAULT_TOLERANCE = 0.25
+# Количество городов в маршруте, который отрисовывается при замере первого рендера
+STARTUP_ROUTE_SIZE = 10
+
+# Выполняется в отдельном процессе: замеряет импорт app, создание приложения и первую отрисовку графиков
+STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+dash_app = app.create_app(start_prefetch=False)
+created = time.perf_counter()
+import numpy as np
+from route_forecast import RouteForecast
+size = int(sys.argv[1])
+route_data = RouteForecast([f"Город {i}" for i in range(size)], np.linspace(50, 60, size), np.linspace(30, 60, size),
+                           np.random.default_rng(0).uniform(0, 100, (size, 5, 4))).to_dict()
+route_data.update(city_indices=list(range(size)), submission=1)
+app.render_forecast(route_data)
+rendered = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "ready": created - start,
+    "first_render": rendered - created,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def percentile(values: list, q: int) -> float:
+    """
+    :param values: Список замеров
+    :param q: Перцентиль (от 1 до 99)
+    :return: Значение перцентиля
+    """
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def route_cities(size: int) -> list:
+    return [f"Город {i}" for i in range(1, size + 1)]
+
+
+def create_weather_service(server: FakeAccuWeather, workdir: str) -> WeatherService:
+    """
+    Создаёт сервис weather_api, который обращается к локальному серверу и использует отдельные кэши,
+    чтобы замеры не зависели от кэша и квоты настоящего приложения
+    """
+    db_path = os.path.join(workdir, "benchmark.sqlite3")
+    config = WeatherApiConfig(api_key="benchmark", base_url=server.base_url, db_path=db_path,
+                              # Справочник городов не используется, чтобы каждый город запрашивался у API
+                              gazetteer_path=None)
+    # Реестр метрик общий для процесса, поэтому метрики замеров записываются в отдельный файл,
+    # а не в базу приложения
+    metrics.configure(db_path)
+    service = WeatherService(config, client=ApiClient(limiter=QuotaLimiter(db_path, daily_quota=10 ** 9),
+                                                      backoff_base=0.01))
+    service.clear_caches()
+    return service
+
+
+def measure(server: FakeAccuWeather, run, prepare, repeats: int) -> dict:
+    """
+    Выполняет сценарий несколько раз и собирает задержки, число запросов к API и пиковую память
+
+    :param server: Локальный сервер AccuWeather
+    :param run: Функция, которая выполняет сценарий и возвращает список задержек в секундах
+    :param prepare: Функция, которая готовит кэши перед каждым запуском
+    :param repeats: Количество запусков
+    :return: Словарь с результатами замеров
+    """
+    latencies = []
+    upstream_calls = {}
+    for _ in range(repeats):
+        prepare()
+        server.reset_counts()
+        latencies.extend(run())
+        upstream_calls = dict(server.call_counts)
+
+    # Память замеряется отдельным запуском, так как tracemalloc заметно замедляет выполнение
+    prepare()
+    tracemalloc.start()
+    run()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "upstream_calls": upstream_calls,
+        "peak_memory_kb": round(peak_memory / 1024, 1),
+    }
+
+
+def ignore_progress(progress) -> None:
+    pass
+
+
+def timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_benchmarks(sizes: tuple, repeats: int, latency: float) -> dict:
+    """
+    Замеряет update_forecast и функции weather_api на маршрутах заданных размеров
+
+    :param sizes: Количество городов в маршрутах
+    :param repeats: Количество запусков каждого сценария
+    :param latency: Задержка ответа локального сервера AccuWeather в секундах
+    :return: Результаты замеров по сценариям
+    """
+    import app
+    # plotly загружается при первой отрисовке; его импорт замеряется отдельно (--startup),
+    # а в сценарии не входит
+    import figures  # noqa: F401
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, FakeAccuWeather(latency=latency) as server:
+        service = create_weather_service(server, workdir)
+        reset_caches = service.clear_caches
+        for size in sizes:
+            cities = route_cities(size)
+            route_input = ", ".join(cities)
+
+            def submit_route():
+                route_data, _ = app.update_forecast(ignore_progress, 1, route_input, service=service)
+                app.render_forecast(route_data)
+                return route_data
+
+            def run_update_forecast():
+                return [timed(submit_route)]
+
+            def warm_up():
+                reset_caches()
+                submit_route()
+
+            route_data = None
+
+            def prepare_render():
+                nonlocal route_data
+                route_data = submit_route()
+
+            def run_render_forecast():
+                return [timed(app.render_forecast, route_data)]
+
+            def run_city_lookups():
+                return [timed(weather_api.get_location_key_by_city_name, city, return_geo=True, service=service)
+                        for city in cities]
+
+            location_keys = [weather_api.get_location_key_by_city_name(city, service=service) for city in cities]
+
+            def run_forecasts():
+                return [timed(weather_api.get_several_days_forecast_by_location_key, key, 5, service=service)
+                        for key in location_keys]
+
+            def clear_forecasts():
+                service.forecast_store.clear()
+
+            results[f"update_forecast/cold/{size}"] = measure(server, run_update_forecast, reset_caches, repeats)
+            results[f"update_forecast/warm/{size}"] = measure(server, run_update_forecast, warm_up, repeats)
+            results[f"render_forecast/{size}"] = measure(server, run_render_forecast, prepare_render, repeats)
+            results[f"render_forecast/{size}"]["payload_kb"] = round(
+                len(json.dumps(app.render_forecast(route_data), cls=PlotlyJSONEncoder)) / 1024, 1
+            )
+            results[f"get_location_key_by_city_name/cold/{size}"] = measure(
+                server, run_city_lookups, reset_caches, repeats
+            )
+            results[f"get_several_days_forecast_by_location_key/cold/{size}"] = measure(
+                server, run_forecasts, clear_forecasts, repeats
+            )
+            print(f"Маршрут из {size} городов: готово", file=sys.stderr)
+    return results
+
+
+def run_startup_benchmark(repeats: int) -> dict:
+    """
+    Замеряет запуск рабочего процесса приложения: каждый запуск выполняется в новом процессе,
+    чтобы модули импортировались заново
+
+    :param repeats: Количество запусков
+    :return: Результаты замеров по этапам: импорт app, создание приложения, готовность
+        (импорт и создание вместе) и первая отрисовка графиков
+    """
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, str(STARTUP_ROUTE_SIZE)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {}
+    for stage in ("import", "create_app", "ready", "first_render"):
+        latencies = [sample[stage] for sample in samples]
+        results[f"startup/{stage}"] = {
+            "samples": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "upstream_calls": {},
+            "peak_memory_kb": max(sample["max_rss_kb"] for sample in samples),
+        }
+    return results
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Сравнивает результаты с базовыми замерами
+
+    Регрессией считается рост p95 больше чем на tolerance или рост числа запросов к API
+
+    :return: Список описаний найденных регрессий
+    """
+    regressions = []
+    for name, base in baseline["results"].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} мс -> {current['p95_ms']} мс")
+        base_calls = sum(base["upstream_calls"].values())
+        current_calls = sum(current["upstream_calls"].values())
+        if current_calls > base_calls:
+            regressions.append(f"{name}: запросов к API {base_calls} -> {current_calls}")
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    print(f"{'Сценарий':<55} {'p50, мс':>10} {'p95, мс':>10} {'запросы':>8} {'память, КБ':>11} {'ответ, КБ':>10}")
+    for name, result in results.items():
+        print(f"{name:<55} {result['p50_ms']:>10} {result['p95_ms']:>10} "
+              f"{sum(result['upstream_calls'].values()):>8} {result['peak_memory_kb']:>11} "
+              f"{result.get('payload_kb', ''):>10}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Замеры производительности на локальной замене AccuWeather")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Количество городов в маршрутах")
+    parser.add_argument("--repeats", type=int, default=3, help="Количество запусков каждого сценария")
+    parser.add_argument("--latency", type=float, default=0.005, help="Задержка ответа API в секундах")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Файл с базовыми замерами")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результаты как базовые")
+    parser.add_argument("--compare", action="store_true", help="Сравнить результаты с базовыми")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--startup", action="store_true",
+                        help="Замерить только запуск приложения (импорт, create_app, первая отрисовка)")
+    args = parser.parse_args()
+
+    if args.startup:
+        results = run_startup_benchmark(args.repeats)
+    else:
+        results = run_benchmarks(tuple(args.sizes), args.repeats, args.latency)
+    print_results(results)
+
+    if args.save_baseline:
+        # Результаты добавляются к уже сохранённым, чтобы замеры запуска и сценариев хранились в одном файле
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+        baseline["results"].update(results)
+        if not args.startup:
+            baseline.update(latency=args.latency, repeats=args.repeats)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=4, ensure_ascii=False)
+        print(f"Базовые замеры сохранены в {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_with_baseline(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Найдены регрессии:")
+            for regression in regressions:
+                print(f"- {regression}")
+            return 1
+        print("Регрессий не найдено")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
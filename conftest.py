@@ -0,0 +1,47 @@
+import pytest
+
+from fake_accuweather import FakeAccuWeather
+from http_client import ApiClient, QuotaLimiter
+from metrics import metrics
+from weather_api import WeatherApiConfig, WeatherService
+
+
+@pytest.fixture(autouse=True, scope="session")
+def metrics_path(tmp_path_factory):
+    # Реестр метрик общий для процесса, поэтому на время тестов он переключается
+    # во временный файл, чтобы метрики тестов не попали в базу приложения
+    original_path = metrics.path
+    path = str(tmp_path_factory.mktemp("metrics") / "metrics.sqlite3")
+    metrics.configure(path)
+    yield path
+    metrics.configure(original_path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "route_weather_cache.sqlite3")
+
+
+@pytest.fixture
+def fake_server():
+    with FakeAccuWeather() as server:
+        yield server
+
+
+@pytest.fixture
+def make_service(fake_server, db_path):
+    """
+    Создаёт сервисы weather_api, которые обращаются к локальному серверу и хранят кэши и квоту
+    во временной базе
+    """
+    def make(daily_quota: int = 10 ** 6, gazetteer_path: str = None) -> WeatherService:
+        config = WeatherApiConfig(api_key="test", base_url=fake_server.base_url, db_path=db_path,
+                                  daily_quota=daily_quota, gazetteer_path=gazetteer_path)
+        limiter = QuotaLimiter(db_path, daily_quota=daily_quota)
+        return WeatherService(config, client=ApiClient(limiter=limiter, backoff_base=0.01))
+    return make
+
+
+@pytest.fixture
+def service(make_service):
+    return make_service()
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from route_densify import great_circle_distance
+from route_forecast import PARAMETERS
+
+# Шаг прогноза AccuWeather в часах (прогноз по дням)
+FORECAST_STEP_HOURS = 24
+# Средняя скорость движения по маршруту, по которой оценивается время в пути, если оно не задано
+DEFAULT_SPEED_KMH = 70.0
+
+# Границы допустимых значений параметров, как в check_bad_weather, и величина превышения,
+# при которой вклад параметра в риск становится максимальным
+RISK_LIMITS = {
+    "temperature": (0.0, 35.0, 10.0),
+    "humidity": (30.0, 80.0, 20.0),
+    "wind_speed": (None, 50.0, 25.0),
+    "precipitation_probability": (None, 70.0, 30.0),
+}
+
+
+@dataclass
+class DepartureSlot:
+    """
+    Вариант времени выезда и оценка погоды на маршруте при выезде в это время
+
+    - departure_hours - Время выезда в часах от начала первого дня прогноза
+
+    - total_risk - Суммарный риск плохой погоды по всем отрезкам маршрута (чем меньше, тем лучше)
+
+    - leg_risks - Риск для каждого отрезка маршрута между соседними точками
+
+    - bad_legs - Количество отрезков, на которых погода плохая хотя бы в одном конце
+    """
+    departure_hours: float
+    total_risk: float
+    leg_risks: np.ndarray
+    bad_legs: int
+
+    @property
+    def day(self) -> int:
+        """
+        :return: Номер дня прогноза, в который начинается поездка (с единицы)
+        """
+        return int(self.departure_hours // FORECAST_STEP_HOURS) + 1
+
+
+def weather_risk(values: np.ndarray) -> np.ndarray:
+    """
+    Оценивает риск плохой погоды для массива прогнозов
+
+    Каждый параметр, вышедший за границы из check_bad_weather, добавляет к риску от 0.5 до 1
+    в зависимости от величины превышения, поэтому риск больше нуля тогда и только тогда,
+    когда check_bad_weather_batch считает погоду плохой
+
+    :param values: Массив формы (..., параметры) с порядком параметров PARAMETERS
+    :return: Массив риска формы (...) от 0 до 4
+    """
+    risk = np.zeros(values.shape[:-1])
+    for index, param in enumerate(PARAMETERS):
+        low, high, scale = RISK_LIMITS[param]
+        value = values[..., index]
+        excess = np.zeros_like(risk)
+        with np.errstate(invalid="ignore"):
+            if low is not None:
+                excess = np.fmax(excess, low - value)
+            excess = np.fmax(excess, value - high)
+        if param == "humidity":
+            # Нулевая влажность, как и в check_bad_weather, означает отсутствие данных
+            excess[value == 0] = 0
+        # fmax пропускает NaN, поэтому отсутствующие значения не добавляют риска
+        risk += np.where(excess > 0, 0.5 + 0.5 * np.minimum(excess / scale, 1), 0)
+    return risk
+
+
+def leg_hours_by_distance(latitudes, longitudes, speed_kmh: float = DEFAULT_SPEED_KMH) -> np.ndarray:
+    """
+    :param latitudes: Географические широты точек маршрута
+    :param longitudes: Географические долготы точек маршрута
+    :param speed_kmh: Средняя скорость движения в км/ч
+    :return: Время в пути по каждому отрезку между соседними точками в часах
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return great_circle_distance(latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]) / speed_kmh
+
+
+def evaluate_departure_slots(values: np.ndarray, leg_hours, slot_hours: float = FORECAST_STEP_HOURS,
+                             step_hours: float = FORECAST_STEP_HOURS) -> tuple:
+    """
+    Оценивает риск на каждом отрезке маршрута для всех вариантов времени выезда сразу
+
+    Для каждого варианта выезда и каждой точки маршрута определяется шаг прогноза, на который
+    приходится прибытие в точку, и риск в точке берётся из этого шага. Риск отрезка - среднее
+    риска в его концах. Варианты, при которых маршрут не укладывается в окно прогноза, отбрасываются.
+
+    :param values: Прогноз маршрута формы (точки, шаги прогноза, параметры), например, RouteForecast.values
+    :param leg_hours: Время в пути по каждому отрезку в часах (на один меньше, чем точек)
+    :param slot_hours: Шаг между вариантами времени выезда в часах
+    :param step_hours: Длительность одного шага прогноза в часах (24 для прогноза по дням, 1 - по часам)
+    :return: Кортеж (время выезда для каждого варианта в часах, массив риска формы (варианты, отрезки),
+        массив риска в точках формы (варианты, точки))
+    """
+    points, steps = values.shape[:2]
+    risk = weather_risk(values)
+    arrival_hours = np.concatenate([[0.0], np.cumsum(np.asarray(leg_hours, dtype=float))])
+    departures = np.arange(0, steps * step_hours, slot_hours, dtype=float)
+    departures = departures[departures + arrival_hours[-1] < steps * step_hours]
+
+    step_index = ((departures[:, None] + arrival_hours[None, :]) // step_hours).astype(int)
+    point_risks = risk[np.arange(points)[None, :], step_index]
+    leg_risks = (point_risks[:, :-1] + point_risks[:, 1:]) / 2
+    return departures, leg_risks, point_risks
+
+
+def rank_departure_slots(values: np.ndarray, leg_hours, slot_hours: float = FORECAST_STEP_HOURS,
+                         step_hours: float = FORECAST_STEP_HOURS, top: int = None) -> list:
+    """
+    Ранжирует варианты времени выезда по суммарному риску плохой погоды на маршруте
+
+    :param values: Прогноз маршрута формы (точки, шаги прогноза, параметры)
+    :param leg_hours: Время в пути по каждому отрезку в часах
+    :param slot_hours: Шаг между вариантами времени выезда в часах
+    :param step_hours: Длительность одного шага прогноза в часах
+    :param top: Сколько лучших вариантов вернуть (по умолчанию - все)
+    :return: Список DepartureSlot от лучшего к худшему; пустой, если маршрут длиннее окна прогноза
+    """
+    departures, leg_risks, point_risks = evaluate_departure_slots(values, leg_hours, slot_hours, step_hours)
+    # Маршрут из одной точки не имеет отрезков: оценивается погода в самой точке
+    total_risks = leg_risks.sum(axis=1) if leg_risks.shape[1] else point_risks.sum(axis=1)
+    bad_points = point_risks > 0
+    bad_legs = (bad_points[:, :-1] | bad_points[:, 1:]).sum(axis=1)
+    # При равном риске раньше в списке оказывается более ранний выезд
+    order = np.argsort(total_risks, kind="stable")[:top]
+    return [DepartureSlot(float(departures[i]), float(total_risks[i]), leg_risks[i], int(bad_legs[i]))
+            for i in order]
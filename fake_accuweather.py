@@ -0,0 +1,208 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+# Сколько секунд ответ с прогнозом считается актуальным (заголовок Expires)
+FORECAST_EXPIRES_SECONDS = 60 * 60
+QUOTA_EXCEEDED_MESSAGE = {
+    "Code": "ServiceUnavailable",
+    "Message": "The allowed number of requests has been exceeded.",
+}
+
+
+def _stable_hash(value: str) -> int:
+    return zlib.crc32(value.encode())
+
+
+def _city_geo_position(city_name: str) -> tuple:
+    h = _stable_hash(city_name.strip().casefold())
+    return 40 + (h % 30000) / 1000, 20 + (h // 30000 % 120000) / 1000
+
+
+def _daily_forecast(location_key: str, day: int, now: float) -> dict:
+    h = _stable_hash(f"{location_key}:{day}")
+    return {
+        "Date": time.strftime("%Y-%m-%dT07:00:00+00:00", time.gmtime(now + day * 86400)),
+        "EpochDate": int(now // 86400 * 86400 + day * 86400),
+        "Day": {
+            "WetBulbTemperature": {"Average": {"Value": -10 + h % 110, "Unit": "F", "UnitType": 18}},
+            "RelativeHumidity": {"Minimum": 10, "Maximum": 100, "Average": 10 + h // 7 % 90},
+            "Wind": {"Speed": {"Value": h // 11 % 40, "Unit": "mi/h", "UnitType": 9}},
+            "PrecipitationProbability": h // 13 % 101,
+        },
+    }
+
+
+class FakeAccuWeather:
+    """
+    Локальная замена API AccuWeather для тестов и замеров производительности без сети и квоты
+
+    Обслуживает адреса, которые использует weather_api:
+
+    - /locations/v1/cities/search - поиск города по названию
+
+    - /locations/v1/cities/geoposition/search - поиск локации по координатам
+
+    - /forecasts/v1/daily/1day/{key} и /forecasts/v1/daily/5day/{key} - прогноз погоды
+
+    Ответы детерминированы: один и тот же город всегда получает один ключ, координаты и прогноз.
+    Задержка ответа (latency, в секундах), доля ответов с ошибкой 500 (error_rate)
+    и количество запросов до исчерпания квоты (quota) настраиваются.
+    Названия городов из unknown_cities не находятся.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 quota: Optional[int] = None, unknown_cities: tuple = (), seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.quota = quota
+        self.unknown_cities = {city.casefold() for city in unknown_cities}
+        self.call_counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.call_counts.values())
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.call_counts.clear()
+
+    def start(self) -> "FakeAccuWeather":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeAccuWeather":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, path: str, query: dict) -> tuple:
+        """
+        Формирует ответ на запрос
+
+        :param path: Путь запроса
+        :param query: Параметры запроса
+        :return: Кортеж (код ответа, тело ответа, дополнительные заголовки)
+        """
+        endpoint = _endpoint_name(path)
+        with self._lock:
+            self.call_counts[endpoint] += 1
+            total_calls = sum(self.call_counts.values())
+            is_error = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota is not None and total_calls > self.quota:
+            return 503, QUOTA_EXCEEDED_MESSAGE, {}
+        if is_error:
+            return 500, {"Code": "ServerError", "Message": "Internal Server Error"}, {}
+
+        q = query.get("q", [""])[0]
+        if endpoint == "cities/search":
+            if not q.strip() or q.strip().casefold() in self.unknown_cities:
+                return 200, [], {}
+            latitude, longitude = _city_geo_position(q)
+            return 200, [{
+                "Key": str(_stable_hash(q.strip().casefold()) % 10 ** 7),
+                "LocalizedName": q.strip(),
+                "GeoPosition": {"Latitude": latitude, "Longitude": longitude},
+            }], {}
+        if endpoint == "geoposition/search":
+            try:
+                latitude, longitude = (round(float(value), 1) for value in q.split(","))
+            except ValueError:
+                return 400, {"Code": "400", "Message": "Invalid q parameter"}, {}
+            return 200, {
+                "Key": str(_stable_hash(f"{latitude},{longitude}") % 10 ** 7),
+                "GeoPosition": {"Latitude": latitude, "Longitude": longitude},
+            }, {}
+        match = re.fullmatch(r"/forecasts/v1/daily/(1|5)day/(\w+)", path)
+        if match:
+            days, location_key = int(match.group(1)), match.group(2)
+            now = time.time()
+            headers = {"Expires": formatdate(now + FORECAST_EXPIRES_SECONDS, usegmt=True)}
+            return 200, {
+                "Headline": {},
+                "DailyForecasts": [_daily_forecast(location_key, day, now) for day in range(days)],
+            }, headers
+        return 404, {"Code": "ResourceNotFound", "Message": "Not found"}, {}
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status_code, body, headers = fake.handle(url.path, parse_qs(url.query))
+                data = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _endpoint_name(path: str) -> str:
+    if path.startswith("/locations/v1/cities/geoposition/search"):
+        return "geoposition/search"
+    if path.startswith("/locations/v1/cities/search"):
+        return "cities/search"
+    match = re.match(r"/forecasts/v1/daily/(\w+)/", path)
+    if match:
+        return f"daily/{match.group(1)}"
+    return "other"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная замена API AccuWeather")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа в секундах")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой 500")
+    parser.add_argument("--quota", type=int, default=None, help="Количество запросов до исчерпания квоты")
+    args = parser.parse_args()
+
+    server = FakeAccuWeather(args.host, args.port, args.latency, args.error_rate, args.quota)
+    print(f"Локальный AccuWeather запущен на {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
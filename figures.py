@@ -0,0 +1,161 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from route_forecast import PARAMETERS, RouteForecast
+
+PARAMETER_DISPLAY_NAMES = {
+    "temperature": "Температура (°C)",
+    "humidity": "Влажность (%)",
+    "wind_speed": "Скорость ветра (км/ч)",
+    "precipitation_probability": "Вероятность осадков (%)",
+}
+# Параметры, которые по порядку приоритета задают размер маркеров на карте
+SIZE_PARAMETER_PRIORITY = ("humidity", "wind_speed", "precipitation_probability")
+MAX_MARKER_SIZE = 20
+# Если городов больше, графики строятся одной WebGL-линией на параметр вместо линии на город
+MAX_TRACES_PER_CITY = 20
+SUBPLOT_HEIGHT = 280
+VERTICAL_SPACING = 0.06
+
+# Небольшой шаблон оформления вместо стандартного шаблона plotly, который занимает
+# несколько килобайт в каждой фигуре
+LEAN_TEMPLATE = go.layout.Template(layout={
+    "font": {"color": "#2a3f5f"},
+    "plot_bgcolor": "#E5ECF6",
+    "xaxis": {"gridcolor": "white"},
+    "yaxis": {"gridcolor": "white"},
+    "colorway": ["#636efa", "#EF553B", "#00cc96", "#ab63fa", "#FFA15A",
+                 "#19d3f3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"],
+})
+
+
+def build_route_map(route_forecast: RouteForecast, selected_parameters: list) -> go.Figure:
+    """
+    Строит карту маршрута с данными о погоде в первый день прогноза
+
+    :param route_forecast: Прогноз погоды для точек маршрута
+    :param selected_parameters: Параметры, которые показываются при наведении на точку
+    :return: Фигура plotly
+    """
+    first_day = np.round(route_forecast.values[:, 0, :], 2)
+    bad_weather = route_forecast.bad_weather_mask(days=1)[:, 0]
+    latitudes = np.round(route_forecast.latitudes, 4)
+    longitudes = np.round(route_forecast.longitudes, 4)
+
+    hover_lines = [f"{PARAMETER_DISPLAY_NAMES[param]}: %{{customdata[{i}]}}"
+                   for i, param in enumerate(selected_parameters)]
+    marker = {
+        "color": first_day[:, PARAMETERS.index("temperature")],
+        "colorscale": "Plasma",
+        "colorbar": {"title": {"text": PARAMETER_DISPLAY_NAMES["temperature"]}},
+    }
+    size_parameter = next((param for param in SIZE_PARAMETER_PRIORITY if param in selected_parameters), None)
+    if size_parameter:
+        sizes = np.nan_to_num(first_day[:, PARAMETERS.index(size_parameter)])
+        marker.update(size=sizes, sizemode="area", sizemin=2,
+                      sizeref=2 * max(sizes.max(), 1) / MAX_MARKER_SIZE ** 2)
+
+    figure = go.Figure(layout={"template": LEAN_TEMPLATE})
+    figure.add_trace(go.Scattermapbox(
+        lat=latitudes,
+        lon=longitudes,
+        mode="markers",
+        marker=marker,
+        text=route_forecast.cities,
+        customdata=first_day[:, [PARAMETERS.index(param) for param in selected_parameters]],
+        # Пометка о плохой погоде выводится последней строкой подсказки
+        hovertext=np.where(bad_weather, "Плохая погода", ""),
+        hovertemplate="<b>%{text}</b><br>" + "".join(line + "<br>" for line in hover_lines)
+                      + "%{hovertext}<extra></extra>",
+    ))
+    figure.add_trace(go.Scattermapbox(
+        lat=latitudes,
+        lon=longitudes,
+        mode="lines",
+        line={"width": 3, "color": "blue"},
+        hoverinfo="skip",
+        name="Route",
+    ))
+    figure.update_layout(
+        title="Маршрутная карта с данными о погоде (наведись на город, чтобы увидеть прогноз)",
+        mapbox={
+            "style": "open-street-map",
+            "zoom": 4,
+            "center": {"lat": float(latitudes.mean()), "lon": float(longitudes.mean())},
+        },
+        showlegend=False,
+        margin={"l": 0, "r": 0, "t": 40, "b": 0},
+        # По этим данным assets/figures.js меняет подсказки и размер маркеров в браузере
+        meta={
+            "parameters": list(selected_parameters),
+            "display_names": PARAMETER_DISPLAY_NAMES,
+            "size_priority": list(SIZE_PARAMETER_PRIORITY),
+            "max_marker_size": MAX_MARKER_SIZE,
+        },
+    )
+    return figure
+
+
+def build_forecast_figure(route_forecast: RouteForecast, selected_parameters: list) -> go.Figure:
+    """
+    Строит графики выбранных параметров погоды по дням в одной фигуре с общей осью дней
+
+    :param route_forecast: Прогноз погоды для городов маршрута
+    :param selected_parameters: Параметры, для которых строятся графики
+    :return: Фигура plotly
+    """
+    figure = make_subplots(
+        rows=len(selected_parameters), cols=1, shared_xaxes=True, vertical_spacing=VERTICAL_SPACING,
+        subplot_titles=[f"Параметр прогноза погоды: {PARAMETER_DISPLAY_NAMES[param]}"
+                        for param in selected_parameters],
+    )
+    # По оси X откладываются номера дней, а подписи "День N" задаются один раз в настройках оси
+    days = np.arange(1, route_forecast.days + 1)
+    many_cities = len(route_forecast) > MAX_TRACES_PER_CITY
+
+    for row, param in enumerate(selected_parameters, start=1):
+        values = np.round(route_forecast.parameter(param), 2)
+        figure.update_yaxes(title_text=PARAMETER_DISPLAY_NAMES[param], row=row, col=1)
+        if many_cities:
+            # Одна WebGL-линия на параметр: линии городов разделены пропусками (None)
+            separator = np.full((len(route_forecast), 1), None)
+            figure.add_trace(go.Scattergl(
+                x=np.hstack([np.tile(days, (len(route_forecast), 1)), separator]).ravel(),
+                y=np.hstack([values.astype(object), separator]).ravel(),
+                text=np.repeat(route_forecast.cities, route_forecast.days + 1),
+                mode="lines+markers",
+                line={"width": 1},
+                marker={"size": 4},
+                hovertemplate="%{text}<br>День %{x}: %{y}<extra></extra>",
+                showlegend=False,
+                meta=param,
+            ), row=row, col=1)
+            continue
+        for i, city in enumerate(route_forecast.cities):
+            figure.add_trace(go.Scatter(
+                x=days,
+                y=values[i],
+                mode="lines+markers",
+                name=city,
+                legendgroup=city,
+                showlegend=row == 1,
+                line={"color": LEAN_TEMPLATE.layout.colorway[i % len(LEAN_TEMPLATE.layout.colorway)]},
+                hovertemplate=f"{city}<br>День %{{x}}: %{{y}}<extra></extra>",
+                meta=param,
+            ), row=row, col=1)
+
+    # Параметр каждой линии (meta) и заголовка (name) нужен assets/figures.js,
+    # чтобы оставлять в браузере только выбранные графики
+    for annotation, param in zip(figure.layout.annotations, selected_parameters):
+        annotation.name = param
+    figure.update_xaxes(tickvals=days, ticktext=[f"День {day}" for day in days])
+    figure.update_layout(
+        template=LEAN_TEMPLATE,
+        height=SUBPLOT_HEIGHT * len(selected_parameters) + 60,
+        legend={"title": {"text": "Город"}},
+        margin={"t": 60},
+        hovermode="closest",
+        meta={"subplot_height": SUBPLOT_HEIGHT, "vertical_spacing": VERTICAL_SPACING},
+    )
+    return figure
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+from metrics import CACHE_REQUESTS, metrics
+from storage import SqliteStore
+
+# Максимальное время хранения прогноза, если в ответе указан слишком далёкий срок действия (6 часов)
+DEFAULT_MAX_TTL = 6 * 60 * 60
+# Максимальное количество локаций, прогнозы для которых хранятся в памяти
+DEFAULT_MAX_ENTRIES = 5000
+# Длительность одного дня прогноза в секундах
+FORECAST_DAY_SECONDS = 24 * 60 * 60
+
+
+def forecast_expires_at(payload: dict, expires_header: Optional[str] = None) -> float:
+    """
+    Определяет момент, до которого прогноз погоды остаётся актуальным
+
+    Используется заголовок Expires из ответа AccuWeather, а если его нет -
+    окончание первого дня прогноза (EpochDate первого дня плюс сутки)
+
+    :param payload: Ответ AccuWeather с прогнозом погоды по дням
+    :param expires_header: Значение заголовка Expires из ответа
+    :return: Время окончания актуальности прогноза (unix time)
+    """
+    if expires_header:
+        try:
+            return parsedate_to_datetime(expires_header).timestamp()
+        except (TypeError, ValueError):
+            pass
+    daily_forecasts = payload.get("DailyForecasts") or []
+    if daily_forecasts and "EpochDate" in daily_forecasts[0]:
+        return daily_forecasts[0]["EpochDate"] + FORECAST_DAY_SECONDS
+    return time.time()
+
+
+class PersistentForecastCache(SqliteStore):
+    """
+    Общее для всех процессов хранилище пятидневных прогнозов в SQLite
+
+    Нужно, потому что фоновые callback-и Dash выполняются в отдельных процессах
+    и не видят прогнозы, загруженные в память другими процессами.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS forecast (
+            location_key TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS forecast_expires_at ON forecast (expires_at);
+    """
+
+    def get(self, location_key: str) -> Optional[tuple]:
+        """
+        :param location_key: Ключ локации с сайта AccuWeather
+        :return: Кортеж (ответ AccuWeather, время окончания актуальности) либо None, если прогноза нет или он устарел
+        """
+        row = self.execute(
+            "SELECT payload, expires_at FROM forecast WHERE location_key = ? AND expires_at > ?",
+            (location_key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def expires_at(self, location_key: str) -> Optional[float]:
+        """
+        :return: Время окончания актуальности сохранённого прогноза, либо None, если прогноза нет или он устарел
+        """
+        row = self.execute(
+            "SELECT expires_at FROM forecast WHERE location_key = ? AND expires_at > ?", (location_key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, location_key: str, payload: dict, expires_at: float) -> None:
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO forecast VALUES (?, ?, ?)",
+                               (location_key, json.dumps(payload), expires_at))
+            connection.execute("DELETE FROM forecast WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self) -> None:
+        self.execute("DELETE FROM forecast")
+
+
+class ForecastStore:
+    """
+    Хранилище пятидневных прогнозов погоды в памяти, ключом которого является ключ локации
+
+    Прогноз для локации загружается один раз и используется для любого количества дней
+    от одного до пяти. Запись удаляется, когда истекает срок действия самого прогноза
+    (но не позднее max_ttl). Одновременные запросы для одной локации объединяются в один
+    запрос к AccuWeather.
+
+    fetcher - функция, которая по ключу локации возвращает кортеж
+    (ответ AccuWeather, время окончания актуальности) либо None при ошибке
+
+    persistent - необязательное общее для процессов хранилище, в котором прогноз ищется
+    при отсутствии в памяти и в которое сохраняется каждый загруженный прогноз
+    """
+
+    def __init__(self, fetcher: Callable[[str], Optional[tuple]], max_ttl: float = DEFAULT_MAX_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, persistent: Optional[PersistentForecastCache] = None):
+        self.fetcher = fetcher
+        self.persistent = persistent
+        self.max_ttl = max_ttl
+        self.max_entries = max_entries
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            # Фоновые задачи Dash запускаются через fork и получают копию загрузок, которые
+            # выполняли потоки родителя (например, планировщик prefetch). В дочернем процессе этих
+            # потоков нет и их Future никогда не завершатся, поэтому память хранилища очищается
+            reference = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: reference() and reference()._reset())
+
+    def get(self, location_key: str, refresh: bool = False) -> Optional[dict]:
+        """
+        Возвращает пятидневный прогноз для локации из памяти либо загружает его
+
+        :param location_key: Ключ локации с сайта AccuWeather
+        :param refresh: Загрузить прогноз заново, даже если сохранённый прогноз ещё актуален
+        :return: Ответ AccuWeather с прогнозом погоды по дням, либо None при ошибке
+        """
+        with self._lock:
+            entry = self._entries.get(location_key)
+            if not refresh and entry and entry[1] > time.time():
+                _count_request("memory_hit")
+                return entry[0]
+            future = self._in_flight.get(location_key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[location_key] = future
+
+        if not is_leader:
+            _count_request("shared")
+            return future.result()
+
+        payload = None
+        try:
+            result = self.persistent.get(location_key) if self.persistent and not refresh else None
+            _count_request("refresh" if refresh else "disk_hit" if result else "miss")
+            if not result:
+                result = self.fetcher(location_key)
+                if result and self.persistent:
+                    self.persistent.put(location_key, result[0], min(result[1], time.time() + self.max_ttl))
+            if result:
+                payload, expires_at = result
+                self._put(location_key, payload, expires_at)
+        finally:
+            with self._lock:
+                del self._in_flight[location_key]
+            future.set_result(payload)
+        return payload
+
+    def get_days(self, location_key: str, days: int) -> Optional[list]:
+        """
+        :param location_key: Ключ локации с сайта AccuWeather
+        :param days: Количество дней в прогнозе (целое число от одного до пяти)
+        :return: Список первых days прогнозов по дням из ответа AccuWeather, либо None при ошибке
+        """
+        payload = self.get(location_key)
+        if payload is None:
+            return None
+        return payload["DailyForecasts"][:days]
+
+    def expires_at(self, location_key: str) -> Optional[float]:
+        """
+        :return: Время окончания актуальности прогноза для локации из памяти или общего хранилища,
+            либо None, если актуального прогноза нет
+        """
+        with self._lock:
+            entry = self._entries.get(location_key)
+        if entry and entry[1] > time.time():
+            return entry[1]
+        return self.persistent.expires_at(location_key) if self.persistent else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.persistent:
+            self.persistent.clear()
+
+    def _reset(self) -> None:
+        self._entries = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _put(self, location_key: str, payload: dict, expires_at: float) -> None:
+        now = time.time()
+        expires_at = min(expires_at, now + self.max_ttl)
+        if expires_at <= now:
+            return
+        with self._lock:
+            self._entries.pop(location_key, None)
+            self._entries[location_key] = (payload, expires_at)
+            if len(self._entries) > self.max_entries:
+                for key in [key for key, entry in self._entries.items() if entry[1] <= now]:
+                    del self._entries[key]
+            # Словарь хранит порядок добавления, поэтому удаляются самые старые записи
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+
+def _count_request(result: str) -> None:
+    # shared - запрос дождался загрузки, которую уже начал другой поток
+    metrics.inc(CACHE_REQUESTS, cache="forecast", result=result)
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import mmap
+import os
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+
+from geo_cache import GeoCache, normalize_city_name
+from metrics import CACHE_REQUESTS, metrics
+
+# Файл справочника по умолчанию
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.bin")
+# Количество подсказок для поля ввода маршрута
+DEFAULT_SUGGESTIONS = 10
+# Минимальное сходство по триграммам, при котором название считается похожим на запрос
+MIN_SIMILARITY = 0.3
+
+MAGIC = b"RWGAZ001"
+# Заголовок файла: сигнатура, количество записей, триграмм, вхождений триграмм и размер блока строк
+HEADER = struct.Struct("<8sIIII")
+ENTRY_DTYPE = np.dtype([
+    ("name_offset", "<u4"), ("name_size", "<u2"),
+    ("label_offset", "<u4"), ("label_size", "<u2"),
+    ("key_offset", "<u4"), ("key_size", "<u2"),
+    ("trigrams", "<u2"),
+    ("latitude", "<f8"), ("longitude", "<f8"),
+])
+
+
+@dataclass(frozen=True, slots=True)
+class GazetteerEntry:
+    """
+    Город из справочника
+
+    - name - Название города, как оно записано в исходном списке
+
+    - latitude, longitude - Географические широта и долгота
+
+    - key - Ключ локации AccuWeather (None, если его не было в исходном списке)
+    """
+    name: str
+    latitude: float
+    longitude: float
+    key: Optional[str] = None
+
+
+class Gazetteer:
+    """
+    Локальный справочник городов в бинарном файле, который отображается в память (mmap)
+
+    Записи отсортированы по нормализованному названию, поэтому точный поиск и поиск по началу
+    названия выполняются двоичным поиском. Для поиска с опечатками хранится индекс триграмм:
+    отсортированные коды триграмм и списки записей, в названиях которых они встречаются.
+    Файл не загружается в память целиком и один и тот же файл разделяется всеми процессами.
+    """
+
+    def __init__(self, path: str = DEFAULT_GAZETTEER_PATH):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, entry_count, trigram_count, posting_count, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Файл {path} не является справочником городов")
+
+        offset = HEADER.size
+        self._entries = np.frombuffer(self._mmap, ENTRY_DTYPE, entry_count, offset)
+        offset += ENTRY_DTYPE.itemsize * entry_count
+        self._trigram_codes = np.frombuffer(self._mmap, "<u8", trigram_count, offset)
+        offset += 8 * trigram_count
+        self._trigram_starts = np.frombuffer(self._mmap, "<u4", trigram_count + 1, offset)
+        offset += 4 * (trigram_count + 1)
+        self._postings = np.frombuffer(self._mmap, "<u4", posting_count, offset)
+        offset += 4 * posting_count
+        self._blob = memoryview(self._mmap)[offset:offset + blob_size]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, city_name: str) -> Optional[GazetteerEntry]:
+        """
+        Ищет город по точному (после нормализации) названию
+
+        :param city_name: Название города
+        :return: Город из справочника либо None, если его нет
+        """
+        name = normalize_city_name(city_name)
+        index = self._lower_bound(name)
+        found = index < len(self) and self._name(index) == name
+        metrics.inc(CACHE_REQUESTS, cache="gazetteer", result="hit" if found else "miss")
+        return self._entry(index) if found else None
+
+    def prefix_search(self, prefix: str, limit: int = DEFAULT_SUGGESTIONS) -> list:
+        """
+        :param prefix: Начало названия города
+        :param limit: Максимальное количество результатов
+        :return: Города, названия которых начинаются с prefix, в алфавитном порядке
+        """
+        prefix = normalize_city_name(prefix)
+        if not prefix:
+            return []
+        result = []
+        index = self._lower_bound(prefix)
+        while index < len(self) and len(result) < limit and self._name(index).startswith(prefix):
+            result.append(self._entry(index))
+            index += 1
+        return result
+
+    def fuzzy_search(self, query: str, limit: int = DEFAULT_SUGGESTIONS) -> list:
+        """
+        Ищет города с похожими названиями по доле общих триграмм (коэффициент Жаккара)
+
+        :param query: Название города, возможно, с опечатками
+        :param limit: Максимальное количество результатов
+        :return: Города в порядке убывания сходства с запросом
+        """
+        codes = np.array(sorted(_trigram_codes(normalize_city_name(query))), dtype=np.uint64)
+        if not len(codes) or not len(self._trigram_codes):
+            return []
+        positions = np.minimum(np.searchsorted(self._trigram_codes, codes), len(self._trigram_codes) - 1)
+        positions = positions[self._trigram_codes[positions] == codes]
+        if not len(positions):
+            return []
+        postings = np.concatenate([
+            self._postings[self._trigram_starts[position]:self._trigram_starts[position + 1]]
+            for position in positions
+        ])
+        shared = np.bincount(postings, minlength=len(self))
+        # Сходство не меньше MIN_SIMILARITY возможно, только если общих триграмм не меньше такой доли запроса
+        candidates = np.flatnonzero(shared >= max(1, int(np.ceil(MIN_SIMILARITY * len(codes)))))
+        shared = shared[candidates]
+        similarity = shared / (len(codes) + self._entries["trigrams"][candidates] - shared)
+        order = np.argsort(-similarity, kind="stable")[:limit]
+        return [self._entry(candidates[i]) for i in order if similarity[i] >= MIN_SIMILARITY]
+
+    def suggest(self, text: str, limit: int = DEFAULT_SUGGESTIONS) -> list:
+        """
+        Подсказки для поля ввода: сначала города, названия которых начинаются с text,
+        затем похожие названия (на случай опечатки)
+
+        :param text: Введённая часть названия города
+        :param limit: Максимальное количество подсказок
+        :return: Список городов из справочника
+        """
+        result = self.prefix_search(text, limit)
+        if len(result) < limit:
+            names = {entry.name for entry in result}
+            result.extend(entry for entry in self.fuzzy_search(text, limit) if entry.name not in names)
+        return result[:limit]
+
+    def close(self) -> None:
+        self._entries = self._trigram_codes = self._trigram_starts = self._postings = None
+        self._blob.release()
+        self._mmap.close()
+
+    def _lower_bound(self, name: str) -> int:
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < name:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _string(self, offset: int, size: int) -> str:
+        return str(self._blob[offset:offset + size], "utf-8")
+
+    def _name(self, index: int) -> str:
+        entry = self._entries[index]
+        return self._string(entry["name_offset"], entry["name_size"])
+
+    def _entry(self, index: int) -> GazetteerEntry:
+        entry = self._entries[index]
+        return GazetteerEntry(
+            self._string(entry["label_offset"], entry["label_size"]),
+            float(entry["latitude"]),
+            float(entry["longitude"]),
+            self._string(entry["key_offset"], entry["key_size"]) or None,
+        )
+
+
+def build_gazetteer(rows, path: str = DEFAULT_GAZETTEER_PATH) -> int:
+    """
+    Создаёт файл справочника из списка городов
+
+    Если несколько городов имеют одинаковое нормализованное название, сохраняется первый из них,
+    поэтому более важные города (например, более крупные) стоит размещать в начале списка
+
+    :param rows: Кортежи (название, широта, долгота, ключ локации AccuWeather или пустая строка)
+    :param path: Путь к файлу справочника
+    :return: Количество городов в справочнике
+    """
+    cities = {}
+    for name, latitude, longitude, key in rows:
+        normalized = normalize_city_name(name)
+        if normalized and normalized not in cities:
+            cities[normalized] = (name.strip(), float(latitude), float(longitude), key or "")
+
+    names = sorted(cities)
+    entries = np.zeros(len(names), ENTRY_DTYPE)
+    blob = bytearray()
+    postings = {}
+
+    def add_string(value: str) -> tuple:
+        data = value.encode("utf-8")
+        blob.extend(data)
+        return len(blob) - len(data), len(data)
+
+    for index, normalized in enumerate(names):
+        label, latitude, longitude, key = cities[normalized]
+        codes = _trigram_codes(normalized)
+        entries[index] = (*add_string(normalized), *add_string(label), *add_string(key),
+                          len(codes), latitude, longitude)
+        for code in codes:
+            postings.setdefault(code, []).append(index)
+
+    trigram_codes = np.array(sorted(postings), dtype="<u8")
+    trigram_starts = np.zeros(len(trigram_codes) + 1, dtype="<u4")
+    trigram_starts[1:] = np.cumsum([len(postings[code]) for code in trigram_codes.tolist()])
+    flat_postings = np.fromiter(chain.from_iterable(postings[code] for code in trigram_codes.tolist()),
+                                dtype="<u4", count=int(trigram_starts[-1]))
+
+    # Файл записывается целиком под временным именем, чтобы работающее приложение не увидело его частично
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(entries), len(trigram_codes), len(flat_postings), len(blob)))
+        for array in (entries, trigram_codes, trigram_starts, flat_postings):
+            file.write(array.tobytes())
+        file.write(blob)
+    os.replace(temporary_path, path)
+    return len(entries)
+
+
+def read_cities_csv(path: str):
+    """
+    Читает список городов из CSV с колонками name, latitude, longitude и необязательной колонкой key
+
+    :param path: Путь к CSV-файлу
+    :return: Генератор кортежей (название, широта, долгота, ключ локации)
+    """
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file):
+            yield row["name"], row["latitude"], row["longitude"], row.get("key") or ""
+
+
+def load_gazetteer(path: str = DEFAULT_GAZETTEER_PATH) -> Optional[Gazetteer]:
+    """
+    :param path: Путь к файлу справочника
+    :return: Справочник городов либо None, если файла нет или его не удалось прочитать
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return Gazetteer(path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Не удалось загрузить справочник городов {path}: {repr(e)}")
+        return None
+
+
+def _trigram_codes(name: str) -> set:
+    # Название дополняется пробелами, чтобы начало и конец слова давали отдельные триграммы
+    padded = f"  {name} "
+    return {
+        (ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21) | ord(padded[i + 2])
+        for i in range(len(padded) - 2)
+    } if name else set()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Локальный справочник городов для геокодирования и подсказок")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Создать справочник из CSV (name, latitude, longitude, key)")
+    build_parser.add_argument("input")
+    build_parser.add_argument("--output", default=DEFAULT_GAZETTEER_PATH)
+
+    export_parser = subparsers.add_parser("export-cache",
+                                          help="Выгрузить в CSV города из кэша геолокаций, уже найденные через API")
+    export_parser.add_argument("output")
+
+    search_parser = subparsers.add_parser("search", help="Показать подсказки для введённого текста")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--path", default=DEFAULT_GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_gazetteer(read_cities_csv(args.input), args.output)
+        print(f"Справочник {args.output}: {count} городов")
+    elif args.command == "export-cache":
+        with open(args.output, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("name", "latitude", "longitude", "key"))
+            for name, key, latitude, longitude in GeoCache().iter_cities():
+                writer.writerow((name, latitude, longitude, key))
+        print(f"Города из кэша сохранены в {args.output}")
+    else:
+        gazetteer = load_gazetteer(args.path)
+        if gazetteer is None:
+            print(f"Справочник {args.path} не найден", file=sys.stderr)
+            return 1
+        start = time.perf_counter()
+        suggestions = gazetteer.suggest(args.text)
+        elapsed = time.perf_counter() - start
+        for entry in suggestions:
+            print(f"{entry.name}\t{entry.latitude}\t{entry.longitude}\t{entry.key or ''}")
+        print(f"{elapsed * 1000:.3f} мс", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
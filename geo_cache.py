@@ -0,0 +1,187 @@
+import re
+import threading
+import time
+from typing import Optional
+
+from metrics import CACHE_REQUESTS, metrics
+from storage import DEFAULT_DB_PATH, SqliteStore
+
+# Время жизни записи в кэше геолокаций по умолчанию (30 дней)
+DEFAULT_TTL = 30 * 24 * 60 * 60
+# Максимальное количество записей в каждой таблице кэша по умолчанию
+DEFAULT_MAX_ENTRIES = 10000
+# Шаг сетки для координат в градусах (около 1 км по широте)
+DEFAULT_GRID_STEP = 0.01
+
+
+def normalize_city_name(city_name: str) -> str:
+    """
+    Приводит название города к единому виду: без лишних пробелов, в нижнем регистре
+    и с заменой "ё" на "е"
+
+    :param city_name: Название города
+    :return: Нормализованное название города
+    """
+    return re.sub(r"\s+", " ", city_name).strip().casefold().replace("ё", "е")
+
+
+class GeoCache(SqliteStore):
+    """
+    Кэш ключей локаций AccuWeather в SQLite, который переживает перезапуск приложения
+    и общий для всех процессов Dash
+
+    Хранит соответствия название города -> (ключ, широта, долгота) и
+    координаты -> ключ. Координаты привязываются к сетке с шагом grid_step,
+    поэтому близкие точки попадают в одну запись.
+    Устаревшие по ttl записи не возвращаются, а при превышении max_entries
+    удаляются записи, к которым дольше всего не обращались.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS geo_city (
+            name TEXT PRIMARY KEY,
+            location_key TEXT NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS geo_city_accessed_at ON geo_city (accessed_at);
+        CREATE TABLE IF NOT EXISTS geo_position (
+            lat_cell INTEGER NOT NULL,
+            lon_cell INTEGER NOT NULL,
+            location_key TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (lat_cell, lon_cell)
+        );
+        CREATE INDEX IF NOT EXISTS geo_position_accessed_at ON geo_position (accessed_at);
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, grid_step: float = DEFAULT_GRID_STEP):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.grid_step = grid_step
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def snap(self, latitude: float, longitude: float) -> tuple:
+        """
+        Привязывает координаты к ячейке сетки кэша
+
+        :param latitude: Географическая широта
+        :param longitude: Географическая долгота
+        :return: Номера ячейки сетки по широте и долготе
+        """
+        return round(latitude / self.grid_step), round(longitude / self.grid_step)
+
+    def get_city(self, city_name: str) -> Optional[tuple]:
+        """
+        Ищет в кэше ключ локации и координаты города
+
+        :param city_name: Название города
+        :return: Кортеж (ключ локации, широта, долгота) либо None, если записи нет или она устарела
+        """
+        name = normalize_city_name(city_name)
+        row = self.execute(
+            "SELECT location_key, latitude, longitude, created_at FROM geo_city WHERE name = ?", (name,)
+        ).fetchone()
+        if not self._is_fresh("geo_city", row, row and row[3]):
+            return None
+        self.execute("UPDATE geo_city SET accessed_at = ? WHERE name = ?", (time.time(), name))
+        return row[0], row[1], row[2]
+
+    def put_city(self, city_name: str, location_key: str, latitude: float, longitude: float) -> None:
+        """
+        Сохраняет в кэш ключ локации и координаты города
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO geo_city VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_city_name(city_name), location_key, latitude, longitude, now, now)
+            )
+            self._evict(connection, "geo_city")
+
+    def get_position(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Ищет в кэше ключ локации для точки с заданными координатами
+
+        :param latitude: Географическая широта
+        :param longitude: Географическая долгота
+        :return: Ключ локации либо None, если записи нет или она устарела
+        """
+        lat_cell, lon_cell = self.snap(latitude, longitude)
+        row = self.execute(
+            "SELECT location_key, created_at FROM geo_position WHERE lat_cell = ? AND lon_cell = ?",
+            (lat_cell, lon_cell)
+        ).fetchone()
+        if not self._is_fresh("geo_position", row, row and row[1]):
+            return None
+        self.execute(
+            "UPDATE geo_position SET accessed_at = ? WHERE lat_cell = ? AND lon_cell = ?",
+            (time.time(), lat_cell, lon_cell)
+        )
+        return row[0]
+
+    def put_position(self, latitude: float, longitude: float, location_key: str) -> None:
+        """
+        Сохраняет в кэш ключ локации для точки с заданными координатами
+        """
+        now = time.time()
+        lat_cell, lon_cell = self.snap(latitude, longitude)
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO geo_position VALUES (?, ?, ?, ?, ?)",
+                (lat_cell, lon_cell, location_key, now, now)
+            )
+            self._evict(connection, "geo_position")
+
+    def iter_cities(self):
+        """
+        :return: Генератор кортежей (нормализованное название, ключ локации, широта, долгота)
+            для всех актуальных записей о городах
+        """
+        yield from self.execute(
+            "SELECT name, location_key, latitude, longitude FROM geo_city WHERE created_at >= ? ORDER BY name",
+            (time.time() - self.ttl,)
+        )
+
+    def clear(self) -> None:
+        """
+        Удаляет все записи из кэша и обнуляет счётчики попаданий и промахов
+        """
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM geo_city")
+            connection.execute("DELETE FROM geo_position")
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        :return: Счётчики попаданий (hits) и промахов (misses) кэша в текущем процессе
+        """
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def _is_fresh(self, cache: str, row: Optional[tuple], created_at: Optional[float]) -> bool:
+        fresh = row is not None and time.time() - created_at <= self.ttl
+        with self._stats_lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.inc(CACHE_REQUESTS, cache=cache, result="hit" if fresh else "miss")
+        return fresh
+
+    def _evict(self, connection, table: str) -> None:
+        # Сначала удаляем устаревшие записи, затем - самые давно использованные сверх лимита
+        connection.execute(f"DELETE FROM {table} WHERE created_at < ?", (time.time() - self.ttl,))
+        connection.execute(
+            f"DELETE FROM {table} WHERE rowid IN ("
+            f"SELECT rowid FROM {table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
@@ -0,0 +1,236 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import (QUOTA_REJECTIONS, UPSTREAM_BYTES, UPSTREAM_REQUESTS, UPSTREAM_RETRIES, UPSTREAM_SECONDS,
+                     metrics)
+from storage import DEFAULT_DB_PATH, SqliteStore
+
+# Суточный лимит запросов бесплатного ключа AccuWeather
+DEFAULT_DAILY_QUOTA = 50
+# Сколько секунд запрос может ждать освобождения квоты, прежде чем будет отклонён
+DEFAULT_MAX_WAIT = 5.0
+# Таймауты на установку соединения и на чтение ответа в секундах
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+# Максимальное количество одновременных соединений с одним хостом
+DEFAULT_POOL_MAXSIZE = 10
+# Коды ответа, после которых запрос имеет смысл повторить
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+DAY_SECONDS = 24 * 60 * 60
+# Час (по UTC), в который AccuWeather сбрасывает суточную квоту ключа
+DEFAULT_RESET_HOUR = 0
+
+
+class QuotaExceededError(Exception):
+    """
+    Исключение, которое возникает, когда квота запросов к API исчерпана
+    и запрос не может дождаться её пополнения
+    """
+
+
+class QuotaLimiter(SqliteStore):
+    """
+    Ограничитель запросов по суточной квоте для каждого API-ключа
+
+    Запросы считаются в окнах длиной в сутки, которые начинаются в момент сброса квоты
+    AccuWeather (reset_hour по UTC), поэтому за одни сутки API получает не больше daily_quota
+    запросов с одним ключом. Состояние хранится в SQLite, поэтому квота общая для всех
+    процессов приложения. Если квота окна израсходована, запрос ждёт начала следующего
+    окна не дольше max_wait секунд, иначе отклоняется до обращения к API
+    с исключением QuotaExceededError.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS api_quota_window (
+            key_hash TEXT PRIMARY KEY,
+            window_start REAL NOT NULL,
+            used INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, daily_quota: int = DEFAULT_DAILY_QUOTA,
+                 max_wait: float = DEFAULT_MAX_WAIT, reset_hour: int = DEFAULT_RESET_HOUR):
+        super().__init__(path)
+        self.daily_quota = daily_quota
+        self.max_wait = max_wait
+        self.reset_hour = reset_hour
+
+    def window_start(self, now: Optional[float] = None) -> float:
+        """
+        :param now: Момент времени (по умолчанию - текущий)
+        :return: Начало суточного окна квоты, в которое попадает момент now
+        """
+        now = time.time() if now is None else now
+        offset = self.reset_hour * 60 * 60
+        return (now - offset) // DAY_SECONDS * DAY_SECONDS + offset
+
+    def acquire(self, api_key: str) -> None:
+        """
+        Учитывает один запрос с данным API-ключом, при необходимости дожидаясь сброса квоты
+
+        :param api_key: API-ключ, с которым будет выполнен запрос
+        :raises QuotaExceededError: Если квота не сбросится в течение max_wait секунд
+        """
+        key_hash = _hash_api_key(api_key)
+        while True:
+            with self.transaction() as connection:
+                used, window_start = self._current_window(connection, key_hash)
+                if used < self.daily_quota:
+                    connection.execute("UPDATE api_quota_window SET used = used + 1 WHERE key_hash = ?",
+                                       (key_hash,))
+                    return
+            wait = window_start + DAY_SECONDS - time.time()
+            if wait > self.max_wait:
+                raise QuotaExceededError(
+                    f"Квота запросов к API исчерпана, следующий запрос возможен через {wait:.0f} с"
+                )
+            time.sleep(max(wait, 0.0))
+
+    def remaining(self, api_key: str) -> int:
+        """
+        :param api_key: API-ключ
+        :return: Количество запросов, оставшихся до сброса квоты
+        """
+        with self.transaction() as connection:
+            used, _ = self._current_window(connection, _hash_api_key(api_key))
+        return max(self.daily_quota - used, 0)
+
+    def exhaust(self, api_key: str) -> None:
+        """
+        Отмечает квоту ключа израсходованной до конца окна, если API сообщил, что она уже исчерпана
+        """
+        key_hash = _hash_api_key(api_key)
+        with self.transaction() as connection:
+            self._current_window(connection, key_hash)
+            connection.execute("UPDATE api_quota_window SET used = MAX(used, ?) WHERE key_hash = ?",
+                               (self.daily_quota, key_hash))
+
+    def _current_window(self, connection, key_hash: str) -> tuple:
+        # Возвращает (количество запросов в текущем окне, начало окна), начиная новое окно при необходимости
+        window_start = self.window_start()
+        row = connection.execute("SELECT window_start, used FROM api_quota_window WHERE key_hash = ?",
+                                 (key_hash,)).fetchone()
+        if row is None or row[0] != window_start:
+            connection.execute("INSERT OR REPLACE INTO api_quota_window VALUES (?, ?, 0)", (key_hash, window_start))
+            return 0, window_start
+        return row[1], window_start
+
+
+class ApiClient:
+    """
+    HTTP-клиент для запросов к AccuWeather
+
+    Использует общий пул соединений с keep-alive и ограничением числа соединений на хост,
+    явные таймауты, повтор запросов при сетевых ошибках и ответах 429/5xx
+    с экспоненциальной задержкой со случайным разбросом, а также ограничитель квоты.
+    """
+
+    def __init__(self, limiter: Optional[QuotaLimiter] = None, timeout: tuple = DEFAULT_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX, pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Сессия с пулом соединений. В дочернем процессе (например, в фоновом callback-е Dash)
+        создаётся своя сессия, чтобы процессы не использовали одни и те же сокеты
+        """
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=self.pool_maxsize, pool_block=True)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def get(self, url: str, params: dict) -> requests.Response:
+        """
+        Выполняет GET-запрос с повторами и учётом квоты API-ключа из параметра apikey
+
+        :param url: Адрес запроса
+        :param params: Параметры запроса
+        :return: Ответ сервера (последний, если все попытки завершились ошибкой 429/5xx)
+        :raises QuotaExceededError: Если квота запросов исчерпана
+        :raises requests.RequestException: Если все попытки завершились сетевой ошибкой
+        """
+        api_key = params.get("apikey", "")
+        endpoint = endpoint_label(url)
+        for attempt in range(self.max_retries + 1):
+            is_last_attempt = attempt == self.max_retries
+            if attempt:
+                metrics.inc(UPSTREAM_RETRIES, endpoint=endpoint)
+            if self.limiter:
+                try:
+                    self.limiter.acquire(api_key)
+                except QuotaExceededError:
+                    metrics.inc(QUOTA_REJECTIONS, endpoint=endpoint)
+                    raise
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(endpoint, type(e).__name__, time.perf_counter() - start, 0)
+                if is_last_attempt:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+            self._record(endpoint, str(response.status_code), time.perf_counter() - start, len(response.content))
+            if _is_quota_exceeded_response(response):
+                # Повторять запрос бессмысленно: квота уже израсходована
+                if self.limiter:
+                    self.limiter.exhaust(api_key)
+                return response
+            if response.status_code not in RETRY_STATUS_CODES or is_last_attempt:
+                return response
+            self._sleep_before_retry(attempt)
+
+    @staticmethod
+    def _record(endpoint: str, status: str, seconds: float, size: int) -> None:
+        metrics.inc(UPSTREAM_REQUESTS, endpoint=endpoint, status=status)
+        metrics.observe(UPSTREAM_SECONDS, seconds, endpoint=endpoint, status=status)
+        metrics.inc(UPSTREAM_BYTES, size, endpoint=endpoint)
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+
+def endpoint_label(url: str) -> str:
+    """
+    Убирает из пути запроса ключ локации, чтобы запросы к одному адресу API
+    попадали в одну метку метрик
+
+    :param url: Адрес запроса
+    :return: Путь запроса, например /forecasts/v1/daily/5day/{key}
+    """
+    return re.sub(r"/\d+(?=/|$)", "/{key}", urlparse(url).path)
+
+
+def _hash_api_key(api_key: str) -> str:
+    # Сам ключ не сохраняется на диск
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def _is_quota_exceeded_response(response: requests.Response) -> bool:
+    # AccuWeather отвечает 503 с текстом "The allowed number of requests has been exceeded."
+    return response.status_code == 503 and "exceeded" in response.text.lower()
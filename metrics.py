@@ -0,0 +1,242 @@
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from storage import DEFAULT_DB_PATH, SqliteStore
+
+# Границы корзин гистограмм длительности в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Как часто (в секундах) накопленные в процессе значения записываются в общее хранилище
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Названия метрик, которые используются в приложении
+UPSTREAM_REQUESTS = "weather_api_upstream_requests_total"
+UPSTREAM_SECONDS = "weather_api_upstream_request_seconds"
+UPSTREAM_BYTES = "weather_api_upstream_response_bytes_total"
+UPSTREAM_RETRIES = "weather_api_upstream_retries_total"
+QUOTA_REJECTIONS = "weather_api_quota_rejections_total"
+QUOTA_REMAINING = "weather_api_quota_remaining"
+CACHE_REQUESTS = "route_weather_cache_requests_total"
+STAGE_SECONDS = "route_weather_stage_seconds"
+PREFETCH_REFRESHES = "route_weather_prefetch_refreshes_total"
+
+# Описания метрик для строк # HELP
+METRIC_HELP = {
+    UPSTREAM_REQUESTS: "Запросы к AccuWeather по адресам и кодам ответа",
+    UPSTREAM_SECONDS: "Длительность запросов к AccuWeather в секундах",
+    UPSTREAM_BYTES: "Объём ответов AccuWeather в байтах",
+    UPSTREAM_RETRIES: "Повторные запросы к AccuWeather",
+    QUOTA_REJECTIONS: "Запросы, отклонённые до обращения к API из-за исчерпанной квоты",
+    QUOTA_REMAINING: "Количество запросов, доступных сейчас по квоте API-ключа",
+    CACHE_REQUESTS: "Обращения к кэшам по результату",
+    STAGE_SECONDS: "Длительность этапов построения прогноза маршрута в секундах",
+    PREFETCH_REFRESHES: "Заблаговременные обновления прогнозов популярных локаций по результату",
+}
+
+
+class MetricsRegistry(SqliteStore):
+    """
+    Счётчики, гистограммы и показатели (gauge) в формате Prometheus
+
+    Значения накапливаются в памяти процесса и периодически добавляются в общую таблицу SQLite,
+    поэтому в /metrics попадают и измерения из фоновых процессов Dash.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS metric (
+            name TEXT NOT NULL,
+            labels TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (name, labels)
+        );
+        CREATE TABLE IF NOT EXISTS metric_meta (
+            name TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            help TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        super().__init__(path)
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._meta = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        if hasattr(os, "register_at_fork"):
+            # Фоновые задачи Dash запускаются через fork: копия ещё не записанных значений родителя
+            # записалась бы и дочерним процессом, и самим родителем, поэтому в дочернем процессе она удаляется
+            reference = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: reference() and reference()._reset_after_fork())
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels) -> None:
+        """
+        Увеличивает счётчик
+
+        :param name: Название метрики
+        :param value: Величина увеличения
+        :param help: Описание метрики
+        :param labels: Метки значения
+        """
+        with self._lock:
+            self._meta.setdefault(name, ("counter", help or METRIC_HELP.get(name, "")))
+            self._add(name, labels, value)
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, help: str = "", buckets: tuple = DEFAULT_BUCKETS, **labels) -> None:
+        """
+        Добавляет наблюдение в гистограмму
+
+        :param name: Название метрики
+        :param value: Наблюдаемое значение (например, длительность в секундах)
+        :param help: Описание метрики
+        :param buckets: Границы корзин гистограммы
+        :param labels: Метки значения
+        """
+        with self._lock:
+            self._meta.setdefault(name, ("histogram", help or METRIC_HELP.get(name, "")))
+            # Пустые корзины тоже записываются: Prometheus ожидает все границы гистограммы
+            for bound in buckets:
+                self._add(f"{name}_bucket", {**labels, "le": _format_number(bound)}, 1 if value <= bound else 0)
+            self._add(f"{name}_bucket", {**labels, "le": "+Inf"}, 1)
+            self._add(f"{name}_sum", labels, value)
+            self._add(f"{name}_count", labels, 1)
+        self._maybe_flush()
+
+    def set_gauge(self, name: str, value: float, help: str = "", **labels) -> None:
+        """
+        Устанавливает текущее значение показателя сразу в общем хранилище
+        """
+        with self.transaction() as connection:
+            self._write_meta(connection, {name: ("gauge", help or METRIC_HELP.get(name, ""))})
+            connection.execute("INSERT OR REPLACE INTO metric VALUES (?, ?, ?)", (name, _encode_labels(labels), value))
+
+    @contextmanager
+    def timer(self, name: str, help: str = "", **labels):
+        """
+        Замеряет длительность блока кода и добавляет её в гистограмму
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, help, **labels)
+
+    def flush(self) -> None:
+        """
+        Добавляет накопленные в процессе значения в общее хранилище
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            meta = dict(self._meta)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        with self.transaction() as connection:
+            self._write_meta(connection, meta)
+            connection.executemany(
+                "INSERT INTO metric VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                [(name, labels, value) for (name, labels), value in pending.items()]
+            )
+
+    def render(self) -> str:
+        """
+        :return: Все метрики в текстовом формате Prometheus
+        """
+        self.flush()
+        meta = {name: (kind, help) for name, kind, help in self.execute("SELECT name, kind, help FROM metric_meta")}
+        samples = {}
+        for name, labels, value in self.execute("SELECT name, labels, value FROM metric"):
+            base_name = _histogram_base_name(name, meta)
+            samples.setdefault(base_name, []).append((name, json.loads(labels), value))
+
+        lines = []
+        for base_name in sorted(samples):
+            kind, help = meta.get(base_name, ("untyped", ""))
+            if help:
+                lines.append(f"# HELP {base_name} {help}")
+            lines.append(f"# TYPE {base_name} {kind}")
+            for name, labels, value in sorted(samples[base_name], key=_sample_sort_key):
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def configure(self, path: str) -> None:
+        """
+        Переключает реестр на другой файл базы данных (например, в тестах и бенчмарках)
+
+        Накопленные значения перед переключением записываются в прежний файл.
+        :param path: Путь к новому файлу базы данных
+        """
+        self.flush()
+        with self._lock:
+            self.path = path
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM metric")
+            connection.execute("DELETE FROM metric_meta")
+
+    def _reset_after_fork(self) -> None:
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _add(self, name: str, labels: dict, value: float) -> None:
+        key = (name, _encode_labels(labels))
+        self._pending[key] = self._pending.get(key, 0) + value
+
+    def _maybe_flush(self) -> None:
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    @staticmethod
+    def _write_meta(connection, meta: dict) -> None:
+        connection.executemany(
+            "INSERT OR IGNORE INTO metric_meta VALUES (?, ?, ?)",
+            [(name, kind, help) for name, (kind, help) in meta.items()]
+        )
+
+
+def _encode_labels(labels: dict) -> str:
+    return json.dumps({key: str(value) for key, value in labels.items()}, sort_keys=True, ensure_ascii=False)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample_sort_key(sample: tuple) -> tuple:
+    # Корзины гистограммы выводятся по возрастанию границы, затем - сумма и количество
+    name, labels, _ = sample
+    other_labels = sorted((key, value) for key, value in labels.items() if key != "le")
+    le = float(labels["le"].replace("+Inf", "inf")) if "le" in labels else 0.0
+    return other_labels, name.endswith("_count"), name.endswith("_sum"), le
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _histogram_base_name(name: str, meta: dict) -> str:
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and meta.get(name[:-len(suffix)], ("",))[0] == "histogram":
+            return name[:-len(suffix)]
+    return name
+
+
+# Общий реестр метрик приложения
+metrics = MetricsRegistry()
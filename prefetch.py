@@ -0,0 +1,219 @@
+import threading
+import time
+from typing import Optional
+
+from metrics import PREFETCH_REFRESHES, metrics
+from storage import DEFAULT_DB_PATH, SqliteStore
+from weather_api import WeatherService, default_service
+
+# Время, за которое популярность локации уменьшается вдвое (сутки)
+DEFAULT_HALF_LIFE = 24 * 60 * 60
+# Максимальное количество локаций, популярность которых хранится
+DEFAULT_MAX_LOCATIONS = 5000
+# Как часто (в секундах) планировщик проверяет популярные локации
+DEFAULT_INTERVAL = 60.0
+# За сколько секунд до окончания актуальности прогноз популярной локации обновляется
+DEFAULT_REFRESH_AHEAD = 15 * 60
+# Доля суточной квоты API, которую могут расходовать заблаговременные обновления
+DEFAULT_QUOTA_SHARE = 0.2
+# Сколько самых популярных локаций проверяется за один проход
+DEFAULT_TOP_LOCATIONS = 50
+# Минимальная популярность (примерно - число недавних запросов), при которой локация обновляется заранее
+DEFAULT_MIN_SCORE = 2.0
+
+
+class LocationPopularity(SqliteStore):
+    """
+    Популярность локаций по запросам пользователей с экспоненциальным затуханием
+
+    Каждый запрос локации добавляет к её популярности единицу, а накопленное значение
+    уменьшается вдвое за half_life секунд. Данные хранятся в SQLite, поэтому запросы
+    из фоновых процессов Dash учитываются, а популярность сохраняется после перезапуска.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS prefetch_location (
+            location_key TEXT PRIMARY KEY,
+            score REAL NOT NULL,
+            scored_at REAL NOT NULL,
+            refreshed_at REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS prefetch_location_scored_at ON prefetch_location (scored_at);
+        CREATE TABLE IF NOT EXISTS prefetch_budget (
+            window_start REAL PRIMARY KEY,
+            used INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, half_life: float = DEFAULT_HALF_LIFE,
+                 max_locations: int = DEFAULT_MAX_LOCATIONS):
+        super().__init__(path)
+        self.half_life = half_life
+        self.max_locations = max_locations
+
+    def record(self, location_keys: list) -> None:
+        """
+        Учитывает запрос локаций; локация, которая встречается в маршруте несколько раз, учитывается один раз
+
+        :param location_keys: Ключи локаций AccuWeather из запрошенного маршрута
+        """
+        location_keys = list(dict.fromkeys(key for key in location_keys if key))
+        if not location_keys:
+            return
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO prefetch_location (location_key, score, scored_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (location_key) DO UPDATE SET "
+                "score = score * ? + 1, scored_at = excluded.scored_at",
+                # Затухание считается в Python, так как математические функции есть не во всех сборках SQLite
+                [(key, now, self._decay(connection, key, now)) for key in location_keys]
+            )
+            connection.execute(
+                "DELETE FROM prefetch_location WHERE rowid IN ("
+                "SELECT rowid FROM prefetch_location ORDER BY scored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_locations,)
+            )
+
+    def hottest(self, limit: int = DEFAULT_TOP_LOCATIONS, min_score: float = 0.0) -> list:
+        """
+        :param limit: Максимальное количество локаций
+        :param min_score: Минимальная популярность
+        :return: Список кортежей (ключ локации, популярность) по убыванию популярности
+        """
+        now = time.time()
+        rows = self.execute("SELECT location_key, score, scored_at FROM prefetch_location")
+        scores = [(key, score * 0.5 ** ((now - scored_at) / self.half_life)) for key, score, scored_at in rows]
+        scores = [(key, score) for key, score in scores if score >= min_score]
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:limit]
+
+    def claim_refresh(self, location_key: str, min_interval: float, window_start: float, budget: float) -> bool:
+        """
+        Отмечает, что прогноз локации сейчас будет обновлён, если его не обновляли за последние
+        min_interval секунд и в бюджете обновлений на текущее окно квоты остался хотя бы один запрос.
+        Проверка и учёт выполняются в одной транзакции, поэтому несколько процессов приложения
+        не обновляют одну локацию дважды и вместе не выходят за бюджет
+
+        :param location_key: Ключ локации AccuWeather
+        :param min_interval: Минимальный интервал между обновлениями одной локации в секундах
+        :param window_start: Начало текущего суточного окна квоты API
+        :param budget: Количество обновлений, разрешённых в окне
+        :return: True, если обновлять прогноз должен вызывающий процесс
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            if self._budget_used(connection, window_start) + 1 > budget:
+                return False
+            cursor = connection.execute(
+                "UPDATE prefetch_location SET refreshed_at = ? WHERE location_key = ? AND refreshed_at <= ?",
+                (now, location_key, now - min_interval)
+            )
+            if cursor.rowcount == 0:
+                return False
+            connection.execute(
+                "INSERT INTO prefetch_budget VALUES (?, 1) ON CONFLICT (window_start) DO UPDATE SET used = used + 1",
+                (window_start,)
+            )
+            # Счётчики прошедших окон больше не нужны
+            connection.execute("DELETE FROM prefetch_budget WHERE window_start < ?", (window_start,))
+        return True
+
+    def budget_used(self, window_start: float) -> int:
+        """
+        :param window_start: Начало суточного окна квоты API
+        :return: Количество заблаговременных обновлений в окне
+        """
+        return self._budget_used(self._connection(), window_start)
+
+    def clear(self) -> None:
+        self.execute("DELETE FROM prefetch_location")
+        self.execute("DELETE FROM prefetch_budget")
+
+    @staticmethod
+    def _budget_used(connection, window_start: float) -> int:
+        row = connection.execute("SELECT used FROM prefetch_budget WHERE window_start = ?", (window_start,)).fetchone()
+        return row[0] if row else 0
+
+    def _decay(self, connection, location_key: str, now: float) -> float:
+        row = connection.execute(
+            "SELECT scored_at FROM prefetch_location WHERE location_key = ?", (location_key,)
+        ).fetchone()
+        return 0.5 ** ((now - row[0]) / self.half_life) if row else 1.0
+
+
+class PrefetchScheduler:
+    """
+    Фоновый поток, который заранее обновляет прогнозы самых популярных локаций
+
+    Раз в interval секунд берутся top_locations самых популярных локаций, и прогнозы тех из них,
+    которые устаревают в ближайшие refresh_ahead секунд (или уже устарели), загружаются заново.
+    Обновления учитываются отдельно от запросов пользователей и в каждом суточном окне квоты API
+    расходуют не больше quota_share от daily_quota: остальная часть квоты остаётся пользователям.
+    """
+
+    def __init__(self, popularity: LocationPopularity, service: Optional[WeatherService] = None,
+                 interval: float = DEFAULT_INTERVAL, refresh_ahead: float = DEFAULT_REFRESH_AHEAD,
+                 quota_share: float = DEFAULT_QUOTA_SHARE,
+                 top_locations: int = DEFAULT_TOP_LOCATIONS, min_score: float = DEFAULT_MIN_SCORE):
+        self.popularity = popularity
+        self.service = service or default_service()
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.quota_share = quota_share
+        self.top_locations = top_locations
+        self.min_score = min_score
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Запускает фоновый поток, если он ещё не запущен
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="forecast-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_once(self) -> int:
+        """
+        Выполняет один проход планировщика
+
+        :return: Количество обновлённых прогнозов
+        """
+        window_start, budget = self._quota_budget()
+        refreshed = 0
+        for location_key, _ in self.popularity.hottest(self.top_locations, self.min_score):
+            if self._stop.is_set() or self.popularity.budget_used(window_start) + 1 > budget:
+                break
+            expires_at = self.service.forecast_store.expires_at(location_key)
+            if expires_at is not None and expires_at - time.time() > self.refresh_ahead:
+                continue
+            if not self.popularity.claim_refresh(location_key, self.refresh_ahead, window_start, budget):
+                continue
+            payload = self.service.forecast_store.get(location_key, refresh=True)
+            metrics.inc(PREFETCH_REFRESHES, result="ok" if payload else "error")
+            refreshed += 1
+        metrics.flush()
+        return refreshed
+
+    def _quota_budget(self) -> tuple:
+        # Окно и бюджет совпадают с окном ограничителя квоты; без ограничителя бюджет не ограничен
+        limiter = self.service.client.limiter
+        if limiter is None:
+            return 0.0, float("inf")
+        return limiter.window_start(), int(limiter.daily_quota * self.quota_share)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                # Ошибка одного прохода не должна останавливать планировщик
+                print(f"Ошибка при заблаговременном обновлении прогнозов: {repr(e)}")
+
@@ -0,0 +1,79 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import parse_qs
+
+# Папка, в которую сохраняются профили callback-ов
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+# Количество функций в кратком отчёте, который выводится в консоль
+PROFILE_TOP = 20
+# Сколько последних профилей хранится в PROFILES_DIR, более старые удаляются
+MAX_PROFILES = 50
+# Переменная окружения, которая разрешает профилирование параметром адреса страницы
+PROFILING_ENV_VARIABLE = "ROUTE_WEATHER_PROFILING"
+
+
+def is_profiling_enabled() -> bool:
+    """
+    :return: True, если профилирование разрешено на сервере переменной окружения ROUTE_WEATHER_PROFILING
+    """
+    return os.environ.get(PROFILING_ENV_VARIABLE, "").lower() in ("1", "true", "yes")
+
+
+def is_profiling_requested(search: Optional[str]) -> bool:
+    """
+    Проверяет, запрошено ли профилирование параметром profile в адресе страницы (например, /?profile=1)
+
+    Параметр учитывается, только если профилирование разрешено на сервере (is_profiling_enabled),
+    иначе любой посетитель мог бы запускать профилировщик и создавать файлы на сервере
+
+    :param search: Строка запроса из адреса страницы
+    :return: True, если callback нужно выполнить под профилировщиком
+    """
+    if not search or not is_profiling_enabled():
+        return False
+    value = parse_qs(search.lstrip("?")).get("profile", [""])[0]
+    return value.lower() in ("1", "true", "yes")
+
+
+@contextmanager
+def maybe_profile(enabled: bool, name: str):
+    """
+    Выполняет блок кода под cProfile и сохраняет профиль в PROFILES_DIR в формате pstats
+
+    Профилируется только текущий поток: время запросов из пула потоков видно
+    как ожидание результатов в вызывающей функции
+
+    :param enabled: Нужно ли профилировать блок (иначе блок выполняется как обычно)
+    :param name: Название профилируемого блока, с которого начинается имя файла профиля
+    """
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = os.path.join(PROFILES_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.pstats")
+        profiler.dump_stats(path)
+        _remove_old_profiles()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"Профиль {name} сохранён в {path}\n{report.getvalue()}")
+
+
+def _remove_old_profiles() -> None:
+    paths = sorted((os.path.join(PROFILES_DIR, name) for name in os.listdir(PROFILES_DIR) if name.endswith(".pstats")),
+                   key=os.path.getmtime)
+    for path in paths[:-MAX_PROFILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
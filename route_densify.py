@@ -0,0 +1,88 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+# Размер ячейки сетки в километрах: точки в одной ячейке запрашиваются у API один раз.
+# Вне крупных городов локации AccuWeather отстоят друг от друга на десятки километров,
+# а суточный прогноз в пределах ячейки почти не меняется
+DEFAULT_CELL_SIZE_KM = 40.0
+
+
+def _to_unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(latitudes), np.radians(longitudes)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def great_circle_distance(latitude1, longitude1, latitude2, longitude2) -> np.ndarray:
+    """
+    Считает расстояние по дуге большого круга (формула гаверсинусов), работает и с массивами
+
+    :return: Расстояние в километрах
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float))
+                              for value in (latitude1, longitude1, latitude2, longitude2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def interpolate_leg(latitude1: float, longitude1: float, latitude2: float, longitude2: float,
+                    spacing_km: float) -> tuple:
+    """
+    Строит промежуточные точки на дуге большого круга между двумя точками маршрута
+
+    :param spacing_km: Желаемое расстояние между соседними точками в километрах
+    :return: Кортеж массивов (широты, долготы) промежуточных точек без концов отрезка
+    """
+    distance = float(great_circle_distance(latitude1, longitude1, latitude2, longitude2))
+    segments = int(np.ceil(distance / spacing_km)) if spacing_km > 0 else 1
+    if segments <= 1:
+        return np.empty(0), np.empty(0)
+    start, end = _to_unit_vectors(np.array([latitude1, latitude2]), np.array([longitude1, longitude2]))
+    angle = distance / EARTH_RADIUS_KM
+    fractions = np.arange(1, segments) / segments
+    # Сферическая линейная интерполяция между единичными векторами концов отрезка
+    points = (np.sin((1 - fractions) * angle)[:, None] * start
+              + np.sin(fractions * angle)[:, None] * end) / np.sin(angle)
+    latitudes = np.degrees(np.arcsin(np.clip(points[:, 2], -1, 1)))
+    longitudes = np.degrees(np.arctan2(points[:, 1], points[:, 0]))
+    return latitudes, longitudes
+
+
+def densify_route(latitudes: list, longitudes: list, spacing_km: float) -> list:
+    """
+    Добавляет промежуточные точки на каждом отрезке маршрута
+
+    :param latitudes: Широты точек маршрута по порядку
+    :param longitudes: Долготы точек маршрута по порядку
+    :param spacing_km: Желаемое расстояние между соседними точками в километрах
+    :return: Список отрезков: для каждой пары соседних точек - кортеж массивов (широты, долготы)
+    """
+    return [
+        interpolate_leg(latitudes[i], longitudes[i], latitudes[i + 1], longitudes[i + 1], spacing_km)
+        for i in range(len(latitudes) - 1)
+    ]
+
+
+def deduplicate_points(latitudes: np.ndarray, longitudes: np.ndarray,
+                       cell_size_km: float = DEFAULT_CELL_SIZE_KM) -> tuple:
+    """
+    Объединяет точки, попавшие в одну ячейку пространственной сетки
+
+    Ширина ячейки по долготе в градусах растёт с широтой, чтобы ячейки везде были
+    примерно cell_size_km на cell_size_km километров
+
+    :param latitudes: Широты точек
+    :param longitudes: Долготы точек
+    :param cell_size_km: Размер ячейки сетки в километрах
+    :return: Кортеж (индексы точек-представителей ячеек, номер ячейки для каждой точки)
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    latitude_step = cell_size_km / KM_PER_DEGREE
+    rows = np.floor(latitudes / latitude_step)
+    # Ширина ячейки считается по середине её ряда, чтобы все точки ряда делились одинаково
+    row_cos = np.maximum(np.cos(np.radians((rows + 0.5) * latitude_step)), 1e-6)
+    columns = np.floor(longitudes * row_cos / latitude_step)
+    cells = np.stack([rows, columns], axis=-1).astype(np.int64)
+    _, representatives, inverse = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    return representatives, inverse.reshape(-1)
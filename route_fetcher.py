@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import STAGE_SECONDS, metrics
+from route_densify import DEFAULT_CELL_SIZE_KM, deduplicate_points
+from weather_api import WeatherService, default_service
+
+# Максимальное количество одновременных запросов к AccuWeather по умолчанию
+DEFAULT_MAX_WORKERS = 8
+
+
+@dataclass
+class CityForecastResult:
+    """
+    Результат получения прогноза погоды для одного города маршрута
+
+    - city - Название города, как его ввёл пользователь
+
+    - geo_data - Словарь координат latitude, longitude (None при ошибке)
+
+    - forecast_payload - Ответ AccuWeather с пятидневным прогнозом (None при ошибке)
+
+    - error - Сообщение об ошибке для пользователя (None, если ошибки не было)
+
+    - location_key - Ключ локации AccuWeather (None, если его не удалось получить)
+    """
+    city: str
+    geo_data: Optional[dict] = None
+    forecast_payload: Optional[dict] = None
+    error: Optional[str] = None
+    location_key: Optional[str] = None
+
+
+def fetch_city_forecast(city: str, service: Optional[WeatherService] = None) -> CityForecastResult:
+    """
+    Последовательно получает ключ локации и пятидневный прогноз погоды для одного города
+
+    :param city: Название города
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Результат получения прогноза для города
+    """
+    service = service or default_service()
+    with metrics.timer(STAGE_SECONDS, stage="geocoding"):
+        location = service.get_location_by_city_name(city)
+    if not location or not location.key:
+        return CityForecastResult(city, error=f"Не смог получить ключ локации для города {city}.")
+    geo_data = location.geo_data()
+
+    with metrics.timer(STAGE_SECONDS, stage="forecast"):
+        forecast_payload = service.get_forecast_payload_by_location_key(location.key)
+    if not forecast_payload:
+        return CityForecastResult(city, geo_data=geo_data, location_key=location.key,
+                                  error=f"Не смог получить данные о погоде для города {city}.")
+    return CityForecastResult(city, geo_data=geo_data, forecast_payload=forecast_payload, location_key=location.key)
+
+
+def fetch_route_forecasts(cities: list, max_workers: int = DEFAULT_MAX_WORKERS,
+                          service: Optional[WeatherService] = None) -> list:
+    """
+    Параллельно получает прогнозы погоды для всех городов маршрута
+
+    Для каждого города запрос ключа локации и запрос прогноза выполняются друг за другом
+    в отдельном потоке, поэтому запросы для разных городов идут одновременно.
+    Ошибка в одном городе не отменяет получение прогнозов для остальных.
+
+    :param cities: Список названий городов в порядке маршрута
+    :param max_workers: Максимальное количество одновременных запросов
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Список результатов CityForecastResult в порядке маршрута
+    """
+    results = [None] * len(cities)
+    for index, result in iter_route_forecasts(cities, max_workers, service):
+        results[index] = result
+    return results
+
+
+def iter_route_forecasts(cities: list, max_workers: int = DEFAULT_MAX_WORKERS,
+                         service: Optional[WeatherService] = None):
+    """
+    Параллельно получает прогнозы погоды для городов маршрута и выдаёт результаты
+    по мере готовности, чтобы их можно было показывать пользователю, не дожидаясь всего маршрута
+
+    :param cities: Список названий городов в порядке маршрута
+    :param max_workers: Максимальное количество одновременных запросов
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Генератор кортежей (индекс города в маршруте, CityForecastResult) в порядке готовности
+    """
+    if not cities:
+        return
+    service = service or default_service()
+    max_workers = max(1, min(max_workers, len(cities)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_safe_fetch_city_forecast, city, service): index
+                   for index, city in enumerate(cities)}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Если результаты больше не нужны, ещё не начатые запросы отменяются
+            for future in futures:
+                future.cancel()
+
+
+def _safe_fetch_city_forecast(city: str, service: WeatherService) -> CityForecastResult:
+    try:
+        return fetch_city_forecast(city, service)
+    except Exception as e:
+        print(f"Ошибка при получении прогноза погоды для города {city}: {repr(e)}")
+        return CityForecastResult(city, error=f"Не смог получить данные о погоде для города {city}.")
+
+
+def fetch_points_forecasts(names: list, latitudes: list, longitudes: list,
+                           max_workers: int = DEFAULT_MAX_WORKERS, cell_size_km: float = DEFAULT_CELL_SIZE_KM,
+                           service: Optional[WeatherService] = None) -> list:
+    """
+    Параллельно получает прогнозы погоды для точек, заданных координатами (например, промежуточных точек маршрута)
+
+    Перед запросами точки, попавшие в одну ячейку пространственной сетки, объединяются,
+    а после получения ключей локаций прогноз запрашивается один раз для каждого ключа.
+    Поэтому количество запросов к API растёт с количеством различных локаций, а не точек.
+
+    :param names: Названия точек для сообщений и подписей
+    :param latitudes: Географические широты точек
+    :param longitudes: Географические долготы точек
+    :param max_workers: Максимальное количество одновременных запросов
+    :param cell_size_km: Размер ячейки сетки в километрах
+    :param service: Сервис AccuWeather (по умолчанию - weather_api.default_service())
+    :return: Список результатов CityForecastResult в порядке точек
+    """
+    if not names:
+        return []
+    service = service or default_service()
+    representatives, cell_of_point = deduplicate_points(latitudes, longitudes, cell_size_km)
+    max_workers = max(1, min(max_workers, len(representatives)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        cell_location_keys = list(executor.map(
+            lambda i: _safe_call("geocoding", service.get_location_key_by_geo_position, latitudes[i], longitudes[i]),
+            representatives
+        ))
+        unique_location_keys = list(dict.fromkeys(key for key in cell_location_keys if key))
+        payloads = dict(zip(unique_location_keys, executor.map(
+            lambda key: _safe_call("forecast", service.get_forecast_payload_by_location_key, key), unique_location_keys
+        )))
+
+    results = []
+    for name, latitude, longitude, cell in zip(names, latitudes, longitudes, cell_of_point):
+        geo_data = {"latitude": float(latitude), "longitude": float(longitude)}
+        location_key = cell_location_keys[cell]
+        payload = payloads.get(location_key)
+        if payload:
+            results.append(CityForecastResult(name, geo_data=geo_data, forecast_payload=payload,
+                                              location_key=location_key))
+        else:
+            results.append(CityForecastResult(name, geo_data=geo_data, location_key=location_key,
+                                              error=f"Не смог получить данные о погоде для точки {name}."))
+    return results
+
+
+def _safe_call(stage: str, function, *args):
+    try:
+        with metrics.timer(STAGE_SECONDS, stage=stage):
+            return function(*args)
+    except Exception as e:
+        print(f"Ошибка при запросе к API погоды: {repr(e)}")
+        return None
@@ -0,0 +1,120 @@
+from typing import Optional
+
+import numpy as np
+
+from weather_api import check_bad_weather_batch, fahrenheit_to_celsius, miles_to_kilometers
+
+# Параметры прогноза в порядке последней оси массива RouteForecast.values
+PARAMETERS = ("temperature", "humidity", "wind_speed", "precipitation_probability")
+MAX_FORECAST_DAYS = 5
+
+
+class RouteForecast:
+    """
+    Прогноз погоды для всех точек маршрута в столбцовом виде
+
+    - cities - Названия точек маршрута
+
+    - latitudes, longitudes - Массивы координат точек формы (точки,)
+
+    - values - Массив значений формы (точки, дни, параметры) в метрической системе,
+      порядок параметров задан в PARAMETERS, отсутствующие значения - NaN
+    """
+    __slots__ = ("cities", "latitudes", "longitudes", "values")
+
+    def __init__(self, cities: list, latitudes: np.ndarray, longitudes: np.ndarray, values: np.ndarray):
+        self.cities = cities
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.values = values
+
+    @classmethod
+    def from_payloads(cls, cities: list, latitudes: list, longitudes: list, payloads: list,
+                      days: int = MAX_FORECAST_DAYS) -> "RouteForecast":
+        """
+        Строит прогноз маршрута напрямую из ответов AccuWeather, переводя единицы измерения
+        сразу для всего массива
+
+        :param cities: Названия точек маршрута
+        :param latitudes: Географические широты точек
+        :param longitudes: Географические долготы точек
+        :param payloads: Ответы AccuWeather с прогнозом по дням для каждой точки
+        :param days: Количество дней в прогнозе (целое число от одного до пяти)
+        :return: Прогноз погоды для маршрута
+        """
+        values = np.full((len(cities), days, len(PARAMETERS)), np.nan)
+        for i, payload in enumerate(payloads):
+            for day, forecast in enumerate(payload["DailyForecasts"][:days]):
+                day_data = forecast["Day"]
+                values[i, day] = (
+                    _value_or_nan(day_data["WetBulbTemperature"]["Average"]["Value"]),
+                    _value_or_nan(day_data["RelativeHumidity"]["Average"]),
+                    _value_or_nan(day_data["Wind"]["Speed"]["Value"]),
+                    _value_or_nan(day_data["PrecipitationProbability"]),
+                )
+        # Перевод температуры в шкалу Цельсия и скорости ветра в км/ч для всех точек и дней сразу
+        values[..., 0] = fahrenheit_to_celsius(values[..., 0])
+        values[..., 2] = miles_to_kilometers(values[..., 2])
+        return cls(list(cities), np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float), values)
+
+    @property
+    def days(self) -> int:
+        return self.values.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def parameter(self, name: str) -> np.ndarray:
+        """
+        :param name: Название параметра из PARAMETERS
+        :return: Массив значений параметра формы (точки, дни)
+        """
+        return self.values[..., PARAMETERS.index(name)]
+
+    def take(self, indices) -> "RouteForecast":
+        """
+        :param indices: Индексы точек маршрута
+        :return: Прогноз только для выбранных точек в заданном порядке
+        """
+        indices = np.asarray(indices, dtype=int)
+        return RouteForecast([self.cities[i] for i in indices], self.latitudes[indices],
+                             self.longitudes[indices], self.values[indices])
+
+    def to_dict(self) -> dict:
+        """
+        Преобразует прогноз в словарь из списков, например, для хранения в dcc.Store.
+        Значения округляются до сотых, отсутствующие значения заменяются на None
+
+        :return: Словарь с ключами cities, latitudes, longitudes, values
+        """
+        values = np.round(self.values, 2).astype(object)
+        values[np.isnan(self.values)] = None
+        return {
+            "cities": self.cities,
+            "latitudes": self.latitudes.tolist(),
+            "longitudes": self.longitudes.tolist(),
+            "values": values.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RouteForecast":
+        """
+        Восстанавливает прогноз из словаря, полученного методом to_dict
+        """
+        values = np.array(data["values"], dtype=float).reshape(len(data["cities"]), -1, len(PARAMETERS))
+        return cls(list(data["cities"]), np.asarray(data["latitudes"], dtype=float),
+                   np.asarray(data["longitudes"], dtype=float), values)
+
+    def bad_weather_mask(self, days: Optional[int] = None) -> np.ndarray:
+        """
+        Проверяет погоду во всех точках маршрута за один вызов check_bad_weather_batch
+
+        :param days: Количество первых дней прогноза, которые нужно проверить (по умолчанию - все)
+        :return: Булев массив формы (точки, дни), True - погода плохая
+        """
+        values = self.values[:, :days]
+        return check_bad_weather_batch(*(values[..., i] for i in range(len(PARAMETERS))))
+
+
+def _value_or_nan(value) -> float:
+    return np.nan if value is None else value
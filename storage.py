@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Файл базы данных по умолчанию, общий для всех процессов приложения
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "route_weather_cache.sqlite3")
+
+
+class SqliteStore:
+    """
+    Базовый класс для хранилищ в SQLite, которые разделяются между потоками и процессами
+
+    Каждый поток (и каждый процесс после fork) получает своё соединение с базой данных,
+    а журнал WAL позволяет читать данные одновременно с записью из других процессов.
+    Наследники задают схему своих таблиц в атрибуте schema.
+    """
+    schema = ""
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # Соединение открывается заново в дочернем процессе после fork и после смены файла базы
+        if connection is None or self._local.pid != os.getpid() or self._local.path != self.path:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(self.schema)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.path = self.path
+        return connection
+
+    def execute(self, sql: str, parameters: tuple = ()) -> sqlite3.Cursor:
+        return self._connection().execute(sql, parameters)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Открывает транзакцию с блокировкой на запись, чтобы изменения из разных процессов
+        не перемешивались
+        """
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
@@ -0,0 +1,34 @@
+import app
+from weather_api import API_KEY_ENV_VARIABLE, WeatherApiConfig, WeatherService
+
+
+def quota_from_metrics(dash_app) -> int:
+    text = dash_app.server.test_client().get("/metrics").get_data(as_text=True)
+    line = next(line for line in text.splitlines() if line.startswith("weather_api_quota_remaining "))
+    return int(float(line.split()[1]))
+
+
+def test_apps_with_separate_configs_do_not_share_state(tmp_path, fake_server, monkeypatch):
+    monkeypatch.setenv(API_KEY_ENV_VARIABLE, "key-from-env")
+    first_config = WeatherApiConfig(api_key="first", base_url=fake_server.base_url, daily_quota=10,
+                                    db_path=str(tmp_path / "first.sqlite3"), gazetteer_path=None)
+    second_config = WeatherApiConfig(base_url=fake_server.base_url, daily_quota=20,
+                                     db_path=str(tmp_path / "second.sqlite3"), gazetteer_path=None)
+    first, second = WeatherService(first_config), WeatherService(second_config)
+    first_app = app.create_app(background_cache_dir=str(tmp_path / "first"), start_prefetch=False, service=first)
+    second_app = app.create_app(background_cache_dir=str(tmp_path / "second"), start_prefetch=False, service=second)
+
+    assert first.get_location_by_city_name("Москва") is not None
+    assert quota_from_metrics(first_app) == 9
+    assert quota_from_metrics(second_app) == 20
+
+    # Кэш первого сервиса не виден второму: второй снова обращается к API
+    fake_server.reset_counts()
+    assert second.get_location_by_city_name("Москва") is not None
+    assert fake_server.call_counts["cities/search"] == 1
+    assert quota_from_metrics(first_app) == 9
+    assert quota_from_metrics(second_app) == 19
+
+    # Найденный ключ хранится в сервисе, настройки не изменяются
+    assert (first.api_key(), second.api_key()) == ("first", "key-from-env")
+    assert second_config.api_key is None
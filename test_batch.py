@@ -0,0 +1,94 @@
+import csv
+import json
+
+import pytest
+
+from batch import RESULT_COLUMNS, read_routes, run_batch
+
+ROUTES = [
+    {"route_id": "a", "cities": ["Москва", "Тверь"]},
+    {"route_id": "b", "route": "Тверь, Новгород"},
+    {"route_id": "c", "cities": "Псков, Рига"},
+]
+
+
+def write_routes(path, routes=ROUTES) -> str:
+    path.write_text("".join(json.dumps(route, ensure_ascii=False) + "\n" for route in routes), encoding="utf-8")
+    return str(path)
+
+
+def read_rows(path: str) -> list:
+    with open(path, encoding="utf-8", newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def test_read_routes(tmp_path):
+    routes = list(read_routes(write_routes(tmp_path / "routes.jsonl")))
+    assert [(route.route_id, route.cities) for route in routes] == [
+        ("a", ["Москва", "Тверь"]), ("b", ["Тверь", "Новгород"]), ("c", ["Псков", "Рига"]),
+    ]
+
+    csv_path = tmp_path / "routes.csv"
+    csv_path.write_text('route_id,route\nx,"Москва, Тверь"\n,Казань\n', encoding="utf-8")
+    assert [(route.route_id, route.cities) for route in read_routes(str(csv_path))] == [
+        ("x", ["Москва", "Тверь"]), ("2", ["Казань"]),
+    ]
+
+
+def test_run_batch_writes_rows_and_shares_cities(tmp_path, fake_server, service):
+    output = str(tmp_path / "weather.csv")
+    state = run_batch(write_routes(tmp_path / "routes.jsonl"), output, days=2, chunk_size=10, service=service)
+
+    assert state["routes_done"] == 3 and state["rows_written"] == 12 and not state["quota_exhausted"]
+    rows = read_rows(output)
+    assert len(rows) == 12
+    assert [(row["route_id"], row["city"], row["day"]) for row in rows[:2]] == [
+        ("a", "Москва", "1"), ("a", "Москва", "2"),
+    ]
+    assert not any(row["error"] for row in rows)
+    # Тверь есть в двух маршрутах, но запрашивается один раз
+    assert fake_server.call_counts["cities/search"] == 5
+    assert fake_server.call_counts["daily/5day"] == 5
+
+
+def test_run_batch_stops_on_quota_and_resumes(tmp_path, fake_server, make_service):
+    input_path = write_routes(tmp_path / "routes.jsonl")
+    output = str(tmp_path / "weather.csv")
+
+    # Квоты хватает на первый маршрут (2 города и 2 прогноза), а во втором не хватает на прогноз
+    state = run_batch(input_path, output, days=1, chunk_size=1, service=make_service(daily_quota=5))
+    assert state["quota_exhausted"]
+    assert state["routes_done"] == 1
+    assert [row["route_id"] for row in read_rows(output)] == ["a", "a"]
+
+    state = run_batch(input_path, output, days=1, chunk_size=1, resume=True, service=make_service(daily_quota=100))
+    assert not state["quota_exhausted"]
+    assert state["routes_done"] == 3 and state["rows_written"] == 6
+    rows = read_rows(output)
+    assert [row["route_id"] for row in rows] == ["a", "a", "b", "b", "c", "c"]
+    assert not any(row["error"] for row in rows)
+
+
+def test_resume_without_output_starts_over(tmp_path, fake_server, service):
+    input_path = write_routes(tmp_path / "routes.jsonl")
+    output = tmp_path / "weather.csv"
+    run_batch(input_path, str(output), days=1, chunk_size=1, service=service)
+    output.unlink()
+
+    state = run_batch(input_path, str(output), days=1, chunk_size=1, resume=True, service=service)
+    assert state["routes_done"] == 3 and state["rows_written"] == 6
+    assert [row["route_id"] for row in read_rows(str(output))] == ["a", "a", "b", "b", "c", "c"]
+
+
+def test_run_batch_writes_parquet_parts(tmp_path, fake_server, service):
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "weather.parquet"
+    state = run_batch(write_routes(tmp_path / "routes.jsonl"), str(output), "parquet", days=2, chunk_size=2,
+                      service=service)
+
+    assert state["position"] == 2
+    assert sorted(path.name for path in output.iterdir()) == ["part-00000.parquet", "part-00001.parquet"]
+    table = pq.read_table(str(output))
+    assert table.column_names == list(RESULT_COLUMNS)
+    assert table.num_rows == state["rows_written"] == 12
+    assert table.column("route_id").to_pylist()[-1] == "c"
@@ -0,0 +1,52 @@
+import numpy as np
+
+from departure_optimizer import leg_hours_by_distance, rank_departure_slots, weather_risk
+from weather_api import check_bad_weather_batch
+
+GOOD = (20.0, 50.0, 10.0, 10.0)
+BAD = (20.0, 50.0, 10.0, 95.0)
+
+
+def test_weather_risk_matches_check_bad_weather():
+    values = np.random.default_rng(0).uniform([-20, 0, 0, 0], [50, 100, 80, 100], (200, 4))
+    values[:10, 1] = 0
+    values[10:20, 2] = np.nan
+    risk = weather_risk(values)
+    assert np.array_equal(risk > 0, check_bad_weather_batch(*values.T))
+    assert risk.min() >= 0 and risk.max() <= 4
+
+
+def test_best_departure_avoids_bad_day():
+    # Три точки, пять дней; во второй день в средней точке плохая погода
+    values = np.array([[GOOD] * 5, [GOOD, BAD, GOOD, GOOD, GOOD], [GOOD] * 5])
+    slots = rank_departure_slots(values, [1.0, 1.0])
+    assert len(slots) == 5
+    assert slots[0].day == 1 and slots[0].total_risk == 0
+    assert slots[-1].day == 2 and slots[-1].bad_legs == 2
+
+
+def test_long_route_shifts_arrival_days():
+    # Дорога до второй точки занимает сутки: плохая погода во второй точке во второй день
+    # опасна при выезде в первый день
+    values = np.array([[GOOD] * 5, [GOOD, BAD, GOOD, GOOD, GOOD]])
+    slots = rank_departure_slots(values, [24.0])
+    assert [slot.day for slot in slots] == [2, 3, 4, 1]
+    assert slots[-1].total_risk > 0
+
+
+def test_route_longer_than_forecast_has_no_slots():
+    values = np.array([[GOOD] * 5, [GOOD] * 5])
+    assert rank_departure_slots(values, [5 * 24.0]) == []
+
+
+def test_single_point_route_uses_point_risk():
+    values = np.array([[BAD, GOOD, BAD, GOOD, GOOD]])
+    slots = rank_departure_slots(values, [], top=2)
+    assert [slot.day for slot in slots] == [2, 4]
+
+
+def test_leg_hours_by_distance():
+    hours = leg_hours_by_distance([55.7558, 59.9386], [37.6173, 30.3141], speed_kmh=70)
+    # Около 635 км между Москвой и Санкт-Петербургом по прямой
+    assert hours.shape == (1,)
+    assert 8.5 < hours[0] < 9.5
@@ -0,0 +1,164 @@
+import os
+import signal
+import threading
+import time
+import warnings
+from email.utils import formatdate
+
+import pytest
+
+from forecast_cache import FORECAST_DAY_SECONDS, ForecastStore, PersistentForecastCache, forecast_expires_at
+
+
+def make_payload(days: int = 5) -> dict:
+    return {"DailyForecasts": [{"EpochDate": 1000 + day * FORECAST_DAY_SECONDS, "Day": day} for day in range(days)]}
+
+
+class CountingFetcher:
+    """
+    Загрузчик прогнозов для ForecastStore, который считает вызовы и может ждать события перед ответом
+    """
+
+    def __init__(self, ttl: float = 3600, release: threading.Event = None):
+        self.ttl = ttl
+        self.release = release
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, location_key: str):
+        with self._lock:
+            self.calls += 1
+        if self.release:
+            self.release.wait(5)
+        return make_payload(), time.time() + self.ttl
+
+
+def test_concurrent_requests_are_single_flight():
+    release = threading.Event()
+    fetcher = CountingFetcher(release=release)
+    store = ForecastStore(fetcher)
+    results = []
+
+    def get():
+        results.append(store.get("1"))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Все потоки успевают запросить прогноз, пока первый ждёт ответа API
+    deadline = time.time() + 5
+    while len(store._in_flight) == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert fetcher.calls == 1
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+
+
+def test_forecast_is_reused_until_expiry(monkeypatch):
+    fetcher = CountingFetcher(ttl=60)
+    store = ForecastStore(fetcher)
+    assert store.get_days("1", 3) == make_payload()["DailyForecasts"][:3]
+    store.get("1")
+    assert fetcher.calls == 1
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert store.expires_at("1") is None
+    store.get("1")
+    assert fetcher.calls == 2
+
+
+def test_max_ttl_limits_forecast_lifetime(monkeypatch):
+    fetcher = CountingFetcher(ttl=3600)
+    store = ForecastStore(fetcher, max_ttl=10)
+    store.get("1")
+    assert store.expires_at("1") <= time.time() + 10
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    store.get("1")
+    assert fetcher.calls == 2
+
+
+def test_refresh_reloads_forecast():
+    fetcher = CountingFetcher()
+    store = ForecastStore(fetcher)
+    store.get("1")
+    store.get("1", refresh=True)
+    assert fetcher.calls == 2
+
+
+def test_failed_fetch_is_not_cached():
+    calls = []
+    store = ForecastStore(lambda key: calls.append(key))
+    assert store.get("1") is None
+    assert store.get("1") is None
+    assert calls == ["1", "1"]
+
+
+def test_entries_over_limit_are_evicted():
+    fetcher = CountingFetcher()
+    store = ForecastStore(fetcher, max_entries=2)
+    for key in ("1", "2", "3"):
+        store.get(key)
+    assert list(store._entries) == ["2", "3"]
+
+
+def test_persistent_cache_is_shared_between_stores(db_path):
+    fetcher = CountingFetcher()
+    ForecastStore(fetcher, persistent=PersistentForecastCache(db_path)).get("1")
+    other = ForecastStore(fetcher, persistent=PersistentForecastCache(db_path))
+    assert other.get("1") == make_payload()
+    assert other.expires_at("1") is not None
+    assert fetcher.calls == 1
+
+
+def test_expires_at_uses_header_or_first_day():
+    payload = make_payload()
+    assert forecast_expires_at(payload, formatdate(5000, usegmt=True)) == 5000
+    assert forecast_expires_at(payload, "invalid") == 1000 + FORECAST_DAY_SECONDS
+    assert forecast_expires_at(payload) == 1000 + FORECAST_DAY_SECONDS
+
+
+def test_service_requests_forecast_once(fake_server, service):
+    location = service.get_location_by_city_name("Москва")
+    fake_server.reset_counts()
+    assert len(service.get_daily_forecasts(location.key, 5)) == 5
+    assert len(service.get_daily_forecasts(location.key, 1)) == 1
+    assert fake_server.call_counts == {"daily/5day": 1}
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен os.fork")
+def test_forked_child_does_not_wait_for_parent_fetch():
+    parent_pid = os.getpid()
+    release = threading.Event()
+
+    def fetcher(location_key):
+        # В родительском процессе загрузка зависает, пока её не отпустят
+        if os.getpid() == parent_pid:
+            release.wait(5)
+        return make_payload(), time.time() + 3600
+
+    store = ForecastStore(fetcher)
+    thread = threading.Thread(target=store.get, args=("1", True))
+    thread.start()
+    while not store._in_flight:
+        time.sleep(0.01)
+
+    with warnings.catch_warnings():
+        # Python 3.12+ предупреждает о fork в многопоточном процессе, это и проверяется
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid == 0:
+        signal.alarm(5)
+        os._exit(0 if store.get("1") == make_payload() else 1)
+    try:
+        _, status = os.waitpid(pid, 0)
+    finally:
+        release.set()
+        thread.join()
+    assert os.waitstatus_to_exitcode(status) == 0
@@ -0,0 +1,85 @@
+import pytest
+
+from gazetteer import HEADER, Gazetteer, GazetteerEntry, build_gazetteer, load_gazetteer, read_cities_csv
+
+CITIES = [
+    ("Москва", 55.7558, 37.6173, "294021"),
+    ("Казань", 55.7887, 49.1221, "295954"),
+    ("Калуга", 54.5293, 36.2754, ""),
+    ("Ёлкино", 56.0, 38.0, ""),
+    ("москва", 0.0, 0.0, "1"),
+]
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = str(tmp_path / "gazetteer.bin")
+    assert build_gazetteer(CITIES, path) == 4
+    gazetteer = Gazetteer(path)
+    yield gazetteer
+    gazetteer.close()
+
+
+def test_find_exact_name(gazetteer):
+    # Из городов с одинаковым названием сохраняется первый
+    assert gazetteer.find(" МОСКВА ") == GazetteerEntry("Москва", 55.7558, 37.6173, "294021")
+    assert gazetteer.find("елкино") == GazetteerEntry("Ёлкино", 56.0, 38.0, None)
+    assert gazetteer.find("Самара") is None
+    assert gazetteer.find("Мос") is None
+
+
+def test_prefix_search(gazetteer):
+    assert [entry.name for entry in gazetteer.prefix_search("ка")] == ["Казань", "Калуга"]
+    assert [entry.name for entry in gazetteer.prefix_search("ка", limit=1)] == ["Казань"]
+    assert gazetteer.prefix_search("") == []
+
+
+def test_fuzzy_search_finds_typos(gazetteer):
+    assert gazetteer.fuzzy_search("Казнь")[0].name == "Казань"
+    assert gazetteer.fuzzy_search("Масква")[0].name == "Москва"
+    assert gazetteer.fuzzy_search("Владивосток") == []
+
+
+def test_suggest_prefers_prefix_matches(gazetteer):
+    assert [entry.name for entry in gazetteer.suggest("Кал")][0] == "Калуга"
+    assert "Казань" in [entry.name for entry in gazetteer.suggest("Казнь")]
+
+
+def test_file_format(tmp_path):
+    path = str(tmp_path / "gazetteer.bin")
+    build_gazetteer(CITIES, path)
+    with open(path, "rb") as file:
+        magic, entry_count, trigram_count, posting_count, blob_size = HEADER.unpack(file.read(HEADER.size))
+    assert magic == b"RWGAZ001"
+    assert entry_count == 4
+    assert posting_count >= trigram_count > 0
+
+    with open(path, "r+b") as file:
+        file.write(b"NOTAGAZ!")
+    assert load_gazetteer(path) is None
+    assert load_gazetteer(str(tmp_path / "missing.bin")) is None
+
+
+def test_read_cities_csv(tmp_path):
+    path = tmp_path / "cities.csv"
+    path.write_text("name,latitude,longitude,key\nМосква,55.7558,37.6173,294021\nКалуга,54.5293,36.2754,\n",
+                    encoding="utf-8")
+    assert list(read_cities_csv(str(path))) == [
+        ("Москва", "55.7558", "37.6173", "294021"),
+        ("Калуга", "54.5293", "36.2754", ""),
+    ]
+
+
+def test_service_uses_gazetteer(tmp_path, fake_server, make_service):
+    path = str(tmp_path / "gazetteer.bin")
+    build_gazetteer(CITIES, path)
+    service = make_service(gazetteer_path=path)
+
+    location = service.get_location_by_city_name("Москва")
+    assert (location.key, location.latitude, location.longitude) == ("294021", 55.7558, 37.6173)
+    assert fake_server.total_calls == 0
+
+    # Для города без ключа ключ ищется по координатам из справочника
+    location = service.get_location_by_city_name("Калуга")
+    assert (location.latitude, location.longitude) == (54.5293, 36.2754)
+    assert dict(fake_server.call_counts) == {"geoposition/search": 1}
@@ -0,0 +1,66 @@
+import time
+
+from geo_cache import GeoCache, normalize_city_name
+
+
+def test_city_names_are_normalized(db_path):
+    cache = GeoCache(db_path)
+    cache.put_city("  Ёлкино ", "1", 55.0, 37.0)
+    assert cache.get_city("елкино") == ("1", 55.0, 37.0)
+    assert normalize_city_name("Нижний   Новгород") == "нижний новгород"
+
+
+def test_nearby_positions_share_entry(db_path):
+    cache = GeoCache(db_path, grid_step=0.01)
+    cache.put_position(55.751, 37.618, "294021")
+    assert cache.get_position(55.7512, 37.6183) == "294021"
+    assert cache.get_position(55.80, 37.618) is None
+
+
+def test_expired_entries_are_not_returned(db_path, monkeypatch):
+    cache = GeoCache(db_path, ttl=60)
+    cache.put_city("Москва", "1", 55.0, 37.0)
+    cache.put_position(55.0, 37.0, "1")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get_city("Москва") is None
+    assert cache.get_position(55.0, 37.0) is None
+    assert cache.stats() == {"hits": 0, "misses": 2}
+
+
+def test_expired_entries_are_evicted_on_write(db_path, monkeypatch):
+    cache = GeoCache(db_path, ttl=60)
+    cache.put_city("Москва", "1", 55.0, 37.0)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    cache.put_city("Казань", "2", 55.8, 49.1)
+    assert [name for name, *_ in cache.execute("SELECT name FROM geo_city")] == ["казань"]
+
+
+def test_least_recently_used_entries_are_evicted(db_path, monkeypatch):
+    cache = GeoCache(db_path, max_entries=2)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    for key, city in enumerate(("Москва", "Казань")):
+        clock[0] += 1
+        cache.put_city(city, str(key), 55.0, 37.0)
+    # Москва используется позже Казани, поэтому при переполнении удаляется Казань
+    clock[0] += 1
+    assert cache.get_city("Москва") is not None
+    clock[0] += 1
+    cache.put_city("Самара", "2", 53.2, 50.1)
+    assert cache.get_city("Казань") is None
+    assert cache.get_city("Москва") is not None
+    assert cache.get_city("Самара") is not None
+
+
+def test_cache_is_shared_between_instances(db_path):
+    GeoCache(db_path).put_city("Москва", "1", 55.0, 37.0)
+    assert GeoCache(db_path).get_city("Москва") == ("1", 55.0, 37.0)
+
+
+def test_service_uses_geo_cache(fake_server, service):
+    first = service.get_location_by_city_name("Москва")
+    calls = fake_server.total_calls
+    assert service.get_location_by_city_name(" москва ") == first
+    assert fake_server.total_calls == calls
@@ -0,0 +1,56 @@
+import pytest
+
+import weather_api
+from http_client import DAY_SECONDS, QuotaExceededError, QuotaLimiter
+
+
+def test_quota_limiter_refuses_after_daily_quota(db_path):
+    limiter = QuotaLimiter(db_path, daily_quota=3)
+    for _ in range(3):
+        limiter.acquire("key")
+    assert limiter.remaining("key") == 0
+    with pytest.raises(QuotaExceededError):
+        limiter.acquire("key")
+    # Квота учитывается отдельно для каждого ключа
+    assert limiter.remaining("other") == 3
+
+
+def test_quota_limiter_is_shared_through_db(db_path):
+    QuotaLimiter(db_path, daily_quota=5).acquire("key")
+    assert QuotaLimiter(db_path, daily_quota=5).remaining("key") == 4
+
+
+def test_quota_limiter_exhaust(db_path):
+    limiter = QuotaLimiter(db_path, daily_quota=10)
+    limiter.acquire("key")
+    limiter.exhaust("key")
+    assert limiter.remaining("key") == 0
+
+
+def test_quota_window_is_aligned_to_reset_hour(db_path):
+    limiter = QuotaLimiter(db_path, reset_hour=3)
+    midnight = 100 * DAY_SECONDS
+    assert limiter.window_start(midnight + 2 * 3600) == midnight - DAY_SECONDS + 3 * 3600
+    assert limiter.window_start(midnight + 3 * 3600) == midnight + 3 * 3600
+    assert limiter.window_start(midnight + DAY_SECONDS - 1) == midnight + 3 * 3600
+
+
+def test_quota_resets_in_next_window(db_path, monkeypatch):
+    limiter = QuotaLimiter(db_path, daily_quota=1)
+    limiter.acquire("key")
+    with pytest.raises(QuotaExceededError):
+        limiter.acquire("key")
+    next_window = limiter.window_start() + DAY_SECONDS
+    monkeypatch.setattr(limiter, "window_start", lambda now=None: next_window)
+    assert limiter.remaining("key") == 1
+    limiter.acquire("key")
+    assert limiter.remaining("key") == 0
+
+
+def test_requests_over_quota_do_not_reach_api(fake_server, make_service):
+    service = make_service(daily_quota=2)
+    cities = ["Москва", "Казань", "Самара", "Пермь"]
+    locations = [weather_api.get_location_by_city_name(city, service=service) for city in cities]
+    assert [location is not None for location in locations] == [True, True, False, False]
+    assert fake_server.total_calls == 2
+    assert service.quota_remaining() == 0
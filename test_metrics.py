@@ -0,0 +1,88 @@
+import os
+import warnings
+
+import pytest
+
+from metrics import MetricsRegistry, metrics
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return MetricsRegistry(str(tmp_path / "metrics.sqlite3"), flush_interval=3600)
+
+
+def test_render_prometheus_text_format(registry):
+    registry.inc("requests_total", help="Запросы", endpoint="search", status="200")
+    registry.inc("requests_total", 2, endpoint="search", status="200")
+    registry.inc("requests_total", endpoint='a"b', status="500")
+    registry.observe("latency_seconds", 0.02, help="Длительность", buckets=(0.01, 0.1), stage="forecast")
+    registry.set_gauge("quota_remaining", 42)
+
+    assert registry.render() == (
+        "# HELP latency_seconds Длительность\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.01",stage="forecast"} 0\n'
+        'latency_seconds_bucket{le="0.1",stage="forecast"} 1\n'
+        'latency_seconds_bucket{le="+Inf",stage="forecast"} 1\n'
+        'latency_seconds_sum{stage="forecast"} 0.02\n'
+        'latency_seconds_count{stage="forecast"} 1\n'
+        "# TYPE quota_remaining gauge\n"
+        "quota_remaining 42\n"
+        "# HELP requests_total Запросы\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{endpoint="a\\"b",status="500"} 1\n'
+        'requests_total{endpoint="search",status="200"} 3\n'
+    )
+
+
+def test_values_from_several_registries_are_summed(tmp_path):
+    path = str(tmp_path / "metrics.sqlite3")
+    first, second = MetricsRegistry(path), MetricsRegistry(path)
+    first.inc("requests_total")
+    second.inc("requests_total", 2)
+    first.flush()
+    assert "requests_total 3\n" in second.render()
+
+
+def test_configure_switches_open_registry_to_new_file(registry, tmp_path):
+    registry.inc("requests_total")
+    registry.render()
+    registry.inc("requests_total", 2)
+    new_path = str(tmp_path / "other.sqlite3")
+    registry.configure(new_path)
+    registry.inc("requests_total", 5)
+    assert "requests_total 5\n" in registry.render()
+    assert "requests_total 3\n" in MetricsRegistry(str(tmp_path / "metrics.sqlite3")).render()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен os.fork")
+def test_forked_child_does_not_flush_parent_values(registry):
+    registry.inc("requests_total")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        pid = os.fork()
+    if pid == 0:
+        registry.inc("child_requests_total")
+        registry.flush()
+        os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    rendered = registry.render()
+    assert "requests_total 1\n" in rendered
+    assert "child_requests_total 1\n" in rendered
+
+
+def test_metrics_route(tmp_path, service):
+    import app
+
+    dash_app = app.create_app(background_cache_dir=str(tmp_path / "background"), start_prefetch=False,
+                              service=service)
+    # Реестр приложения общий для процесса, поэтому значения других тестов удаляются
+    metrics.clear()
+    service.get_location_by_city_name("Москва")
+    response = dash_app.server.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert f"weather_api_quota_remaining {service.quota_remaining()}\n" in text
+    assert 'weather_api_upstream_requests_total{endpoint="/locations/v1/cities/search",status="200"} 1\n' in text
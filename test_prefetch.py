@@ -0,0 +1,37 @@
+from prefetch import LocationPopularity, PrefetchScheduler
+
+
+def test_popularity_ranks_recent_requests(db_path):
+    popularity = LocationPopularity(db_path)
+    popularity.record(["1", "2", "1"])
+    popularity.record(["1"])
+    assert [key for key, _ in popularity.hottest()] == ["1", "2"]
+    assert [key for key, _ in popularity.hottest(min_score=1.5)] == ["1"]
+
+
+def test_prefetch_stays_within_quota_share(db_path, fake_server, make_service):
+    service = make_service(daily_quota=50)
+    popularity = LocationPopularity(db_path)
+    # Популярность немного уменьшается между запросами, поэтому каждая локация запрашивается трижды
+    for _ in range(3):
+        popularity.record([str(key) for key in range(15)])
+    scheduler = PrefetchScheduler(popularity, service, quota_share=0.2)
+
+    assert scheduler.run_once() == 10
+    assert fake_server.call_counts["daily/5day"] == 10
+    assert popularity.budget_used(service.client.limiter.window_start()) == 10
+    # Бюджет окна израсходован, поэтому следующий проход ничего не обновляет
+    service.forecast_store.clear()
+    assert scheduler.run_once() == 0
+    assert service.quota_remaining() == 40
+
+
+def test_fresh_forecasts_are_not_refreshed(db_path, fake_server, make_service):
+    service = make_service()
+    popularity = LocationPopularity(db_path)
+    popularity.record(["1", "2"])
+    service.forecast_store.get("1")
+    fake_server.reset_counts()
+    # Прогнозы локального сервера актуальны час, поэтому обновляется только локация без прогноза
+    assert PrefetchScheduler(popularity, service, refresh_ahead=60, min_score=0).run_once() == 1
+    assert fake_server.call_counts["daily/5day"] == 1
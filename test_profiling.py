@@ -0,0 +1,29 @@
+import os
+
+import profiling
+from profiling import PROFILING_ENV_VARIABLE, is_profiling_requested, maybe_profile
+
+
+def test_query_parameter_is_ignored_unless_enabled_on_server(monkeypatch):
+    monkeypatch.delenv(PROFILING_ENV_VARIABLE, raising=False)
+    assert not is_profiling_requested("?profile=1")
+
+    monkeypatch.setenv(PROFILING_ENV_VARIABLE, "1")
+    assert is_profiling_requested("?profile=1")
+    assert is_profiling_requested("?a=b&profile=true")
+    assert not is_profiling_requested("?profile=0")
+    assert not is_profiling_requested(None)
+
+
+def test_only_latest_profiles_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILES_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "MAX_PROFILES", 2)
+    for index in range(3):
+        old_path = tmp_path / f"old-{index}.pstats"
+        old_path.write_bytes(b"")
+        os.utime(old_path, (index, index))
+    with maybe_profile(True, "render_forecast"):
+        sum(range(1000))
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 2
+    assert "old-2.pstats" in names and any(name.startswith("render_forecast-") for name in names)
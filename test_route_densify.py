@@ -0,0 +1,58 @@
+import numpy as np
+
+from route_densify import deduplicate_points, densify_route, great_circle_distance, interpolate_leg
+from route_fetcher import CityForecastResult
+
+MOSCOW = (55.7558, 37.6173)
+KAZAN = (55.7887, 49.1221)
+
+
+def test_interpolate_leg_spacing():
+    latitudes, longitudes = interpolate_leg(*MOSCOW, *KAZAN, spacing_km=50)
+    points = np.concatenate([[MOSCOW], np.column_stack([latitudes, longitudes]), [KAZAN]])
+    steps = great_circle_distance(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    # Отрезок около 720 км делится на равные части не длиннее шага
+    assert len(latitudes) == 14
+    assert np.allclose(steps, steps[0]) and steps[0] <= 50
+
+
+def test_interpolate_short_leg_adds_nothing():
+    latitudes, longitudes = interpolate_leg(55.75, 37.61, 55.76, 37.62, spacing_km=10)
+    assert len(latitudes) == len(longitudes) == 0
+    assert [len(leg[0]) for leg in densify_route([55.75, 55.76, 56.0], [37.61, 37.62, 38.0], 10)] == [0, 3]
+
+
+def test_deduplicate_points():
+    latitudes = np.array([55.00, 55.01, 55.02, 56.00, 55.00])
+    longitudes = np.array([37.00, 37.01, 37.02, 37.00, 60.00])
+    representatives, cells = deduplicate_points(latitudes, longitudes, cell_size_km=10)
+    assert len(representatives) == 3
+    assert cells[0] == cells[1] == cells[2]
+    assert len({cells[0], cells[3], cells[4]}) == 3
+    assert np.array_equal(cells[representatives], np.arange(3))
+
+
+def test_deduplicate_cells_have_same_size_in_km():
+    # На широте 60 градус долготы вдвое короче, чем на экваторе, поэтому ячейка шире в градусах
+    _, equator = deduplicate_points([0.0, 0.0], [0.0, 0.15], cell_size_km=20)
+    _, north = deduplicate_points([60.05, 60.05], [0.0, 0.3], cell_size_km=20)
+    assert equator[0] == equator[1]
+    assert north[0] == north[1]
+
+
+def test_long_leg_needs_fewer_lookups_than_samples(fake_server, service):
+    import app
+
+    fetched = [
+        CityForecastResult(name, {"latitude": latitude, "longitude": longitude}, {"DailyForecasts": []})
+        for name, (latitude, longitude) in (("Москва", MOSCOW), ("Казань", KAZAN))
+    ]
+    for spacing in (10, 25):
+        service.clear_caches()
+        fake_server.reset_counts()
+        points, city_indices, failed = app.add_route_samples(fetched, spacing, service)
+        samples = len(points) - len(fetched)
+        assert failed == 0 and city_indices == [0, len(points) - 1]
+        assert fake_server.call_counts["geoposition/search"] < samples
+    # Маршрут с шагом 10 км укладывается в суточную квоту бесплатного ключа
+    assert sum(fake_server.call_counts.values()) < 50
@@ -0,0 +1,36 @@
+from route_fetcher import fetch_route_forecasts, iter_route_forecasts
+
+
+def test_results_keep_route_order(service):
+    cities = ["Москва", "Тверь", "Новгород", "Псков", "Рига"]
+    results = fetch_route_forecasts(cities, max_workers=4, service=service)
+    assert [result.city for result in results] == cities
+    assert all(result.forecast_payload and result.error is None for result in results)
+
+    indexed = dict(iter_route_forecasts(cities, max_workers=4, service=service))
+    assert sorted(indexed) == list(range(len(cities)))
+    assert [indexed[index].city for index in range(len(cities))] == cities
+
+
+def test_failing_city_does_not_drop_others(fake_server, service):
+    fake_server.unknown_cities = {"нигдеград"}
+    results = fetch_route_forecasts(["Москва", "Нигдеград", "Казань"], service=service)
+    assert [result.city for result in results] == ["Москва", "Нигдеград", "Казань"]
+    assert results[1].error and results[1].forecast_payload is None
+    assert results[0].forecast_payload and results[2].forecast_payload
+
+
+def test_exceptions_become_city_errors(service, monkeypatch):
+    def get_location(city_name):
+        if city_name == "Тверь":
+            raise RuntimeError("API недоступен")
+        return original(city_name)
+
+    original = service.get_location_by_city_name
+    monkeypatch.setattr(service, "get_location_by_city_name", get_location)
+    results = fetch_route_forecasts(["Москва", "Тверь", "Казань"], service=service)
+    assert [result.error is None for result in results] == [True, False, True]
+
+
+def test_empty_route(service):
+    assert fetch_route_forecasts([], service=service) == []
@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+
+from route_forecast import PARAMETERS, RouteForecast
+from weather_api import check_bad_weather, check_bad_weather_batch
+
+
+def make_day(temperature_f, humidity, wind_mph, precipitation) -> dict:
+    return {"Day": {
+        "WetBulbTemperature": {"Average": {"Value": temperature_f}},
+        "RelativeHumidity": {"Average": humidity},
+        "Wind": {"Speed": {"Value": wind_mph}},
+        "PrecipitationProbability": precipitation,
+    }}
+
+
+def test_from_payloads_converts_units():
+    payloads = [
+        {"DailyForecasts": [make_day(68, 50, 10, 20), make_day(32, None, 0, 90)]},
+        {"DailyForecasts": [make_day(50, 85, 100, 0)]},
+    ]
+    forecast = RouteForecast.from_payloads(["A", "B"], [55.0, 56.0], [37.0, 38.0], payloads, days=2)
+    assert forecast.values.shape == (2, 2, len(PARAMETERS))
+    assert np.allclose(forecast.values[0, 0], [20.0, 50.0, 16.09, 20.0])
+    assert forecast.parameter("temperature")[0, 1] == 0.0
+    # Отсутствующие значения и дни, которых нет в ответе, заполняются NaN
+    assert np.isnan(forecast.parameter("humidity")[0, 1])
+    assert np.isnan(forecast.values[1, 1]).all()
+    assert forecast.bad_weather_mask().tolist() == [[False, True], [True, False]]
+
+
+def test_dict_round_trip():
+    values = np.array([[[10.123, 50.0, 5.0, np.nan]], [[-3.0, 0.0, 60.0, 80.0]]])
+    forecast = RouteForecast(["A", "B"], np.array([55.0, 56.0]), np.array([37.0, 38.0]), values)
+    data = forecast.to_dict()
+    assert data["values"][0][0] == [10.12, 50.0, 5.0, None]
+
+    restored = RouteForecast.from_dict(data)
+    assert restored.cities == ["A", "B"]
+    assert restored.latitudes.tolist() == [55.0, 56.0]
+    assert np.allclose(restored.values, np.round(values, 2), equal_nan=True)
+    assert restored.take([1]).cities == ["B"]
+
+
+def test_batch_check_matches_scalar_check():
+    samples = {
+        "temperature": (-5, 0, 20, 35, 36),
+        "humidity": (0, 20, 30, 50, 80, 90),
+        "wind_speed": (0, 50, 51),
+        "precipitation_probability": (0, 70, 71),
+    }
+    combinations = np.array(list(itertools.product(*samples.values())), dtype=float)
+    expected = [check_bad_weather(*row) for row in combinations]
+    assert check_bad_weather_batch(*combinations.T).tolist() == expected
@@ -1,5 +1,54 @@
-import weather_api
+import dataclasses
 import json
+import sys
+import types
+
+import pytest
+
+import weather_api
+from weather_api import API_KEY_ENV_VARIABLE, ApiKeyNotFoundError, DailyForecast, Location, WeatherApiConfig
+
+
+def test_daily_forecast_record():
+    forecast = DailyForecast(temperature=20.0, humidity=50, wind_speed=10.0, precipitation_probability=80)
+    assert forecast.to_dict() == {"temperature": 20.0, "humidity": 50, "wind_speed": 10.0,
+                                  "precipitation_probability": 80}
+    assert json.loads(forecast.to_json()) == forecast.to_dict()
+    assert forecast.is_bad_weather()
+    assert not dataclasses.replace(forecast, precipitation_probability=10).is_bad_weather()
+    # Записи неизменяемые и без __dict__
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        forecast.temperature = 0
+    assert not hasattr(forecast, "__dict__")
+    assert Location("1", 55.0, 37.0).geo_data() == {"latitude": 55.0, "longitude": 37.0}
+
+
+def test_forecast_functions_return_records_or_json(fake_server, service):
+    location_key = weather_api.get_location_key_by_city_name("Москва", service=service)
+    forecast = weather_api.get_forecast_data_by_location_key(location_key, service=service)
+    assert isinstance(forecast, DailyForecast)
+    assert json.loads(weather_api.get_forecast_data_by_location_key(location_key, as_json=True,
+                                                                    service=service)) == forecast.to_dict()
+
+    forecasts = weather_api.get_several_days_forecast_by_location_key(location_key, 3, service=service)
+    assert len(forecasts) == 3 and forecasts[0] == forecast
+    as_json = weather_api.get_several_days_forecast_by_location_key(location_key, 3, as_json=True, service=service)
+    assert json.loads(as_json) == [day.to_dict() for day in forecasts]
+    fake_server.error_rate = 1.0
+    assert weather_api.get_forecast_data_by_location_key("other", service=service) is None
+
+
+def test_missing_api_key(fake_server, db_path, monkeypatch):
+    monkeypatch.delenv(API_KEY_ENV_VARIABLE, raising=False)
+    monkeypatch.setitem(sys.modules, "api_key", types.SimpleNamespace(api_key=""))
+    service = weather_api.WeatherService(WeatherApiConfig(base_url=fake_server.base_url, db_path=db_path,
+                                                          gazetteer_path=None))
+    with pytest.raises(ApiKeyNotFoundError, match=API_KEY_ENV_VARIABLE):
+        service.api_key()
+    assert service.get_location_by_city_name("Москва") is None
+    assert service.quota_remaining() is None
+    assert sum(fake_server.call_counts.values()) == 0
+
 
 if __name__ == "__main__":
     # Тестовые запросы, чтобы проверить работоспособность API
@@ -11,29 +60,27 @@ if __name__ == "__main__":
     # Тестовый запрос для места "Екатеринбург"
     location_key = weather_api.get_location_key_by_geo_position(56.837864, 60.594882)
     print("Прогноз погоды в Екатеринбурге")
-    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key)
+    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key, as_json=True)
     print(forecast_data_json)
 
     # Тестовый запрос для места "Москва, Измайлово Гамма"
     location_key = weather_api.get_location_key_by_geo_position(55.791749, 37.748619)
     print("Прогноз погоды в Москве, Измайлово Гамма")
-    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key)
+    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key, as_json=True)
     print(forecast_data_json)
 
     # Тестовый запрос для места с температурой больше 35 градусов
     # (температура может меняться, на момент написания кода - где-то в Африке больше 35 градусов)
     location_key = weather_api.get_location_key_by_geo_position(10.093611, 27.863056)
-    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key)
+    forecast_data = weather_api.get_forecast_data_by_location_key(location_key)
     print("Прогноз погоды в Африке")
-    print(forecast_data_json)
-    dict_data = json.loads(forecast_data_json)
-    print("Результат для места с температурой больше 35 градусов:", weather_api.check_bad_weather(**dict_data))
+    print(forecast_data.to_json())
+    print("Результат для места с температурой больше 35 градусов:", forecast_data.is_bad_weather())
 
     # Тестовый запрос для места с температурой меньше 0 градусов
     # (температура может меняться, на момент написания кода - в Норильске меньше 0 градусов)
     location_key = weather_api.get_location_key_by_geo_position(69.343985, 88.210393)
-    forecast_data_json = weather_api.get_forecast_data_by_location_key(location_key)
+    forecast_data = weather_api.get_forecast_data_by_location_key(location_key)
     print("Прогноз погоды в Норильске")
-    print(forecast_data_json)
-    dict_data = json.loads(forecast_data_json)
-    print("Результат для места с температурой меньше 0 градусов:", weather_api.check_bad_weather(**dict_data))
\ No newline at end of file
+    print(forecast_data.to_json())
+    print("Результат для места с температурой меньше 0 градусов:", forecast_data.is_bad_weather())
\ No newline at end of file
@@ -1,9 +1,106 @@
 import requests
 import json
-from api_key import api_key
+import os
+import numpy as np
+from dataclasses import dataclass
 from typing import Optional, Union
+from forecast_cache import ForecastStore, PersistentForecastCache, forecast_expires_at
+from gazetteer import DEFAULT_GAZETTEER_PATH, load_gazetteer
+from geo_cache import GeoCache
+from http_client import DEFAULT_DAILY_QUOTA, ApiClient, QuotaExceededError, QuotaLimiter
+from metrics import STAGE_SECONDS, metrics
+from storage import DEFAULT_DB_PATH
 
-response_lang = "ru-ru"
+# Переменная окружения, из которой берётся API-ключ, если он не задан в настройках
+API_KEY_ENV_VARIABLE = "ACCUWEATHER_API_KEY"
+
+
+class ApiKeyNotFoundError(Exception):
+    """
+    API-ключ AccuWeather не задан ни в настройках, ни в переменной окружения, ни в файле api_key.py
+    """
+
+
+@dataclass
+class WeatherApiConfig:
+    """
+    Настройки доступа к AccuWeather
+
+    - api_key - API-ключ. Если не задан, при первом запросе сервис берёт его из переменной окружения
+      ACCUWEATHER_API_KEY, а если её нет - из файла api_key.py
+
+    - language - Язык ответов API
+
+    - base_url - Адрес API
+
+    - db_path - Файл SQLite с кэшами и квотой, общий для всех процессов приложения
+
+    - daily_quota - Суточная квота запросов API-ключа
+
+    - gazetteer_path - Файл локального справочника городов (None - не использовать справочник)
+    """
+    api_key: Optional[str] = None
+    language: str = "ru-ru"
+    base_url: str = "http://dataservice.accuweather.com"
+    db_path: str = DEFAULT_DB_PATH
+    daily_quota: int = DEFAULT_DAILY_QUOTA
+    gazetteer_path: Optional[str] = DEFAULT_GAZETTEER_PATH
+
+
+@dataclass(frozen=True, slots=True)
+class DailyForecast:
+    """
+    Прогноз погоды на один день в метрической системе
+
+    - temperature - Средняя дневная температура (°C)
+
+    - humidity - Относительная влажность воздуха (%)
+
+    - wind_speed - Средняя дневная скорость ветра (км/ч)
+
+    - precipitation_probability - Дневная вероятность выпадения осадков (%)
+    """
+    temperature: Optional[float]
+    humidity: Optional[float]
+    wind_speed: Optional[float]
+    precipitation_probability: Optional[float]
+
+    def to_dict(self) -> dict:
+        return {
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "wind_speed": self.wind_speed,
+            "precipitation_probability": self.precipitation_probability,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+    def is_bad_weather(self) -> bool:
+        """
+        :return: Является ли погода плохой по критериям check_bad_weather
+        """
+        return check_bad_weather(self.temperature, self.humidity, self.wind_speed, self.precipitation_probability)
+
+
+@dataclass(frozen=True, slots=True)
+class Location:
+    """
+    Локация AccuWeather
+
+    - key - Ключ локации с сайта AccuWeather
+
+    - latitude, longitude - Географические широта и долгота
+    """
+    key: str
+    latitude: float
+    longitude: float
+
+    def geo_data(self) -> dict:
+        """
+        :return: Словарь координат latitude, longitude
+        """
+        return {"latitude": self.latitude, "longitude": self.longitude}
 
 
 def fahrenheit_to_celsius(temperature: float) -> float:
@@ -27,167 +124,364 @@ def miles_to_kilometers(miles: float) -> float:
     return 1.609 * miles
 
 
-def get_location_key_by_geo_position(latitude: float, longitude: float) -> Optional[str]:
+def _parse_json(response: requests.Response):
+    """
+    Разбирает JSON из ответа AccuWeather и замеряет время разбора
+    """
+    with metrics.timer(STAGE_SECONDS, stage="json_parsing"):
+        return response.json()
+
+
+def _parse_daily_forecast(forecast: dict) -> DailyForecast:
+    """
+    Извлекает из прогноза AccuWeather на один день нужные параметры погоды
+    в метрической системе
+
+    :param forecast: Элемент DailyForecasts из ответа AccuWeather
+    :return: Прогноз погоды на день
+    """
+    day_data = forecast["Day"]
+    # Перевод температуры из шкалы Фаренгейта в шкалу Цельсия
+    # и скорости ветра из мили/ч в км/ч
+    return DailyForecast(
+        temperature=fahrenheit_to_celsius(day_data["WetBulbTemperature"]["Average"]["Value"]),
+        humidity=day_data["RelativeHumidity"]["Average"],
+        wind_speed=miles_to_kilometers(day_data["Wind"]["Speed"]["Value"]),
+        precipitation_probability=day_data["PrecipitationProbability"],
+    )
+
+
+class WeatherService:
+    """
+    Доступ к AccuWeather со своими настройками, HTTP-клиентом, ограничителем квоты и кэшами
+
+    Всё, что нужно для запросов, создаётся по настройкам WeatherApiConfig (или передаётся явно),
+    поэтому несколько сервисов в одном процессе могут работать с разными ключами, адресами API
+    и файлами кэша. Функции модуля используют сервис по умолчанию (см. default_service).
+    """
+
+    def __init__(self, config: Optional[WeatherApiConfig] = None, client: Optional[ApiClient] = None,
+                 geo_cache: Optional[GeoCache] = None, forecast_store: Optional[ForecastStore] = None):
+        """
+        :param config: Настройки доступа к AccuWeather
+        :param client: HTTP-клиент (по умолчанию - с ограничителем квоты config.daily_quota)
+        :param geo_cache: Кэш ключей локаций (по умолчанию - в файле config.db_path)
+        :param forecast_store: Хранилище пятидневных прогнозов (по умолчанию - с копией в файле config.db_path)
+        """
+        self.config = config or WeatherApiConfig()
+        self._api_key = None
+        self.client = client or ApiClient(limiter=QuotaLimiter(self.config.db_path, self.config.daily_quota))
+        self.geo_cache = geo_cache or GeoCache(self.config.db_path)
+        # Локальный справочник городов (None, если он не задан или файл справочника не создан)
+        self.gazetteer = load_gazetteer(self.config.gazetteer_path) if self.config.gazetteer_path else None
+        # Пятидневные прогнозы погоды, из которых выдаются прогнозы на любое количество дней
+        # Копия в SQLite делает загруженные прогнозы доступными фоновым процессам Dash
+        self.forecast_store = forecast_store or ForecastStore(
+            self._fetch_five_day_forecast, persistent=PersistentForecastCache(self.config.db_path)
+        )
+
+    def api_key(self) -> str:
+        """
+        Ключ ищется при первом запросе и запоминается в сервисе, настройки при этом не меняются
+
+        :return: API-ключ из настроек, переменной окружения ACCUWEATHER_API_KEY или файла api_key.py
+        :raises ApiKeyNotFoundError: Если ключ нигде не задан
+        """
+        if self._api_key is None:
+            api_key = self.config.api_key or os.environ.get(API_KEY_ENV_VARIABLE)
+            if not api_key:
+                try:
+                    from api_key import api_key
+                except ImportError:
+                    api_key = None
+            if not api_key:
+                raise ApiKeyNotFoundError(f"API-ключ AccuWeather не найден: задайте его в WeatherApiConfig, "
+                                          f"в переменной окружения {API_KEY_ENV_VARIABLE} или в файле api_key.py")
+            self._api_key = api_key
+        return self._api_key
+
+    def quota_remaining(self) -> Optional[int]:
+        """
+        :return: Количество запросов, оставшихся до сброса квоты, либо None, если квота не учитывается
+        """
+        if self.client.limiter is None:
+            return None
+        try:
+            return self.client.limiter.remaining(self.api_key())
+        except ApiKeyNotFoundError:
+            return None
+
+    def clear_caches(self) -> None:
+        """
+        Очищает кэш ключей локаций и хранилище прогнозов
+        """
+        self.geo_cache.clear()
+        self.forecast_store.clear()
+
+    def get_location_key_by_geo_position(self, latitude: float, longitude: float) -> Optional[str]:
+        """
+        Получает ключ гео-позиции с сайта AccuWeather по географической широте и географической долготе
+
+        :param latitude: Географическая широта
+        :param longitude: Географическая долгота
+        :return: Ключ гео-позиции с сайта AccuWeather
+        """
+        cached_location_key = self.geo_cache.get_position(latitude, longitude)
+        if cached_location_key:
+            return cached_location_key
+
+        q = f"{latitude},{longitude}"
+        geo_base_url = f"{self.config.base_url}/locations/v1/cities/geoposition/search"
+        params = {
+            "q": q,
+            "language": self.config.language,
+        }
+        response = self._get_response(geo_base_url, params, "Ошибка при получении геолокации")
+        if response is None:
+            return
+        response_json = _parse_json(response)
+        if not response_json:
+            return
+        location_key = response_json["Key"]
+        self.geo_cache.put_position(latitude, longitude, location_key)
+        return location_key
+
+    def get_location_by_city_name(self, city_name: str) -> Optional[Location]:
+        """
+        Получает локацию (ключ и координаты) с сайта AccuWeather по названию города
+
+        Сначала город ищется в локальном справочнике и кэше, и только при промахе - через API
+
+        :param city_name: Название города
+        :return: Локация, либо None при ошибке
+        """
+        entry = self.gazetteer.find(city_name) if self.gazetteer else None
+        if entry and entry.key:
+            return Location(entry.key, entry.latitude, entry.longitude)
+
+        cached_location = self.geo_cache.get_city(city_name)
+        if cached_location:
+            return Location(*cached_location)
+
+        if entry:
+            # В справочнике есть координаты, но нет ключа: ключ ищется по координатам
+            location_key = self.get_location_key_by_geo_position(entry.latitude, entry.longitude)
+            if location_key is None:
+                return
+            location = Location(location_key, entry.latitude, entry.longitude)
+            self.geo_cache.put_city(city_name, location.key, location.latitude, location.longitude)
+            return location
+
+        cities_base_url = f"{self.config.base_url}/locations/v1/cities/search"
+        params = {
+            "q": city_name,
+            "language": self.config.language,
+        }
+        response = self._get_response(cities_base_url, params, "Ошибка при получении геолокации")
+        if response is None:
+            return
+        response_json = _parse_json(response)
+        if not response_json:
+            print(f"Не смог получить ключ геолокации для города {city_name}")
+            return
+        geo_position = response_json[0]["GeoPosition"]
+        location = Location(response_json[0]["Key"], geo_position["Latitude"], geo_position["Longitude"])
+        self.geo_cache.put_city(city_name, location.key, location.latitude, location.longitude)
+        return location
+
+    def get_forecast_payload_by_location_key(self, location_key: str) -> Optional[dict]:
+        """
+        :param location_key: Ключ локации с сайта AccuWeather
+        :return: Ответ AccuWeather с прогнозом погоды по дням, либо None при ошибке
+        """
+        return self.forecast_store.get(location_key)
+
+    def get_daily_forecasts(self, location_key: str, days: int) -> Optional[list]:
+        """
+        :param location_key: Ключ локации с сайта AccuWeather
+        :param days: Количество дней в прогнозе
+        :return: Список прогнозов DailyForecast по дням, либо None при ошибке
+        """
+        forecasts = self.forecast_store.get_days(location_key, days)
+        if not forecasts:
+            return
+        return [_parse_daily_forecast(forecast) for forecast in forecasts]
+
+    def _get_response(self, url: str, params: dict, error_message: str) -> Optional[requests.Response]:
+        """
+        Выполняет запрос к AccuWeather через HTTP-клиент сервиса
+
+        :param url: Адрес запроса
+        :param params: Параметры запроса
+        :param error_message: Сообщение, которое выводится в консоль при ошибке
+        :return: Ответ сервера с кодом 200, либо None при ошибке
+        """
+        try:
+            response = self.client.get(url, params={"apikey": self.api_key(), **params})
+        except (ApiKeyNotFoundError, QuotaExceededError, requests.RequestException) as e:
+            print(f"{error_message}: {repr(e)}")
+            return
+        if response.status_code != 200:
+            print(f"{error_message}: {response.text}")
+            return
+        return response
+
+    def _fetch_five_day_forecast(self, location_key: str) -> Optional[tuple]:
+        """
+        Загружает с сайта AccuWeather пятидневный прогноз погоды для локации
+
+        :param location_key: Ключ локации с сайта AccuWeather
+        :return: Кортеж (ответ AccuWeather, время окончания актуальности прогноза), либо None при ошибке
+        """
+        forecast_base_url = f"{self.config.base_url}/forecasts/v1/daily/5day/{location_key}"
+        params = {
+            "language": self.config.language,
+            "details": True,
+        }
+        response = self._get_response(forecast_base_url, params, "Ошибка при получении прогноза погоды")
+        if response is None:
+            return
+        response_json = _parse_json(response)
+        return response_json, forecast_expires_at(response_json, response.headers.get("Expires"))
+
+
+# Сервис, который используют функции модуля, если сервис не передан явно
+_default_service: Optional[WeatherService] = None
+
+
+def default_service() -> WeatherService:
+    """
+    :return: Сервис по умолчанию; создаётся при первом обращении с настройками WeatherApiConfig()
+    """
+    global _default_service
+    if _default_service is None:
+        _default_service = WeatherService()
+    return _default_service
+
+
+def configure(new_config: WeatherApiConfig) -> WeatherService:
+    """
+    Заменяет сервис по умолчанию сервисом с новыми настройками
+
+    :param new_config: Новые настройки
+    :return: Новый сервис по умолчанию
+    """
+    global _default_service
+    _default_service = WeatherService(new_config)
+    return _default_service
+
+
+def get_api_key(service: Optional[WeatherService] = None) -> str:
+    """
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
+    :return: API-ключ из настроек, переменной окружения ACCUWEATHER_API_KEY или файла api_key.py
+    """
+    return (service or default_service()).api_key()
+
+
+def get_location_key_by_geo_position(latitude: float, longitude: float,
+                                     service: Optional[WeatherService] = None) -> Optional[str]:
     """
     Получает ключ гео-позиции с сайта AccuWeather по географической широте и географической долготе
 
     Возвращает полученный ключ гео-позиции в формате строки
     :param latitude: Географическая широта
     :param longitude: Географическая долгота
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
     :return: Ключ гео-позиции с сайта AccuWeather
     """
-    q = f"{latitude},{longitude}"
-    geo_base_url = "http://dataservice.accuweather.com/locations/v1/cities/geoposition/search"
-    params = {
-        "apikey": api_key,
-        "q": q,
-        "language": response_lang,
-    }
-    response = requests.get(geo_base_url, params=params)
-    if response.status_code != 200:
-        print(f"Ошибка при получении геолокации: {response.text}")
-        return
-    if not response.json():
-        return
-    location_key = response.json()["Key"]
-    return location_key
+    return (service or default_service()).get_location_key_by_geo_position(latitude, longitude)
 
 
-def get_location_key_by_city_name(city_name: str, return_geo: bool = False) -> Union[str, tuple, None]:
+def get_location_by_city_name(city_name: str, service: Optional[WeatherService] = None) -> Optional[Location]:
+    """
+    Получает локацию (ключ и координаты) с сайта AccuWeather по названию города
+
+    Сначала город ищется в локальном справочнике и кэше, и только при промахе - через API
+
+    :param city_name: Название города
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
+    :return: Локация, либо None при ошибке
+    """
+    return (service or default_service()).get_location_by_city_name(city_name)
+
+
+def get_location_key_by_city_name(city_name: str, return_geo: bool = False,
+                                  service: Optional[WeatherService] = None) -> Union[str, tuple, None]:
     """
     Получает ключ гео-позиции с сайта AccuWeather по названию города
 
     Возвращает полученный ключ гео-позиции в формате строки
     :param city_name: Название города
     :param return_geo: Нужно ли вернуть информацию о геопозиции (ширину и долготу)
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
     :return: None при ошибке, либо - ключ гео-позиции с сайта AccuWeather.
     При return_geo = True возвращает также словарь координат latitude, longitude
     """
-    cities_base_url = "http://dataservice.accuweather.com/locations/v1/cities/search"
-    params = {
-        "apikey": api_key,
-        "q": city_name,
-        "language": response_lang,
-    }
-    response = requests.get(cities_base_url, params=params)
-    if response.status_code != 200:
-        print(f"Ошибка при получении геолокации: {response.text}")
-        return
-    if not response.json():
-        print(f"Не смог получить ключ геолокации для города {city_name}")
+    location = get_location_by_city_name(city_name, service)
+    if location is None:
         return
-    location_key = response.json()[0]["Key"]
     if return_geo:
-        geo_position = response.json()[0]["GeoPosition"]
-        geo_dict = {
-            "latitude": geo_position["Latitude"],
-            "longitude": geo_position["Longitude"]
-        }
-        return location_key, geo_dict
-    return location_key
-
+        return location.key, location.geo_data()
+    return location.key
 
-def get_forecast_data_by_location_key(location_key: str) -> Optional[str]:
-    """Возвращает данные о дневном прогнозе погоды в локации по её ключу локации
-    с сайта AccuWeather
 
-    Ответ в формате JSON со следующими значениями:
+def get_forecast_payload_by_location_key(location_key: str,
+                                         service: Optional[WeatherService] = None) -> Optional[dict]:
+    """
+    Возвращает необработанный пятидневный прогноз погоды AccuWeather для локации,
+    например, для построения RouteForecast без промежуточных словарей
 
-    - temperature - Средняя дневная температура
+    :param location_key: Ключ локации с сайта AccuWeather
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
+    :return: Ответ AccuWeather с прогнозом погоды по дням, либо None при ошибке
+    """
+    return (service or default_service()).get_forecast_payload_by_location_key(location_key)
 
-    - humidity - Относительная влажность воздуха
 
-    - wind_speed - Средняя дневная скорость воздуха
+def get_forecast_data_by_location_key(location_key: str, as_json: bool = False,
+                                      service: Optional[WeatherService] = None) -> Union[DailyForecast, str, None]:
+    """Возвращает данные о дневном прогнозе погоды в локации по её ключу локации
+    с сайта AccuWeather
 
-    - precipitation_probability - Дневная вероятность выпадения осадков
+    Данные берутся из первого дня пятидневного прогноза, который хранится в forecast_store сервиса
 
     :param location_key: Ключ локации с сайта AccuWeather
-    :return: Данные о погоде в формате JSON, либо None при ошибке
-    """
-    forecast_base_url = f"http://dataservice.accuweather.com/forecasts/v1/daily/1day/{location_key}"
-    params = {
-        "apikey": api_key,
-        "language": response_lang,
-        "details": True,
-    }
-    response = requests.get(forecast_base_url, params=params)
-    if response.status_code != 200:
-        print(f"Ошибка при получении прогноза погоды: {response.text}")
+    :param as_json: Вернуть прогноз строкой в формате JSON с ключами temperature, humidity,
+        wind_speed, precipitation_probability
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
+    :return: Прогноз погоды на день (или строка JSON при as_json = True), либо None при ошибке
+    """
+    forecasts = (service or default_service()).get_daily_forecasts(location_key, 1)
+    if not forecasts:
         return
-    response_json = response.json()
-    forecast = response_json["DailyForecasts"][0]
-    temperature_data = forecast["Day"]["WetBulbTemperature"]["Average"]
-    humidity_data = forecast["Day"]["RelativeHumidity"]["Average"]
-    wind_speed_data = forecast["Day"]["Wind"]["Speed"]
-    precipitation_probability = forecast["Day"]["PrecipitationProbability"]
-
-    # Перевод температуры из шкалы Фаренгейта в шкалу Цельсия
-    temperature_value = fahrenheit_to_celsius(temperature_data["Value"])
-
-    # Перевод скорости в ветра из мили/ч в км/ч
-    wind_speed_value = miles_to_kilometers(wind_speed_data["Value"])
-    result = {
-        "temperature": temperature_value,
-        "humidity": humidity_data,
-        "wind_speed": wind_speed_value,
-        "precipitation_probability": precipitation_probability,
-    }
-    json_result = json.dumps(result, indent=4)
-    return json_result
+    result = forecasts[0]
+    if as_json:
+        return result.to_json()
+    return result
 
 
-def get_several_days_forecast_by_location_key(location_key: str, days: int = 5) -> Optional[list]:
+def get_several_days_forecast_by_location_key(location_key: str, days: int = 5, as_json: bool = False,
+                                              service: Optional[WeatherService] = None) -> Union[list, str, None]:
     """Возвращает данные о прогнозе погоды на несколько дней в локации по её ключу локации
     с сайта AccuWeather
 
-    Ответ в формате списка словарей со следующими значениями:
-
-    - temperature - Средняя дневная температура
-
-    - humidity - Относительная влажность воздуха
-
-    - wind_speed - Средняя дневная скорость воздуха
-
-    - precipitation_probability - Дневная вероятность выпадения осадков
+    Пятидневный прогноз загружается один раз и хранится в forecast_store сервиса,
+    поэтому прогнозы другой длительности для той же локации не требуют новых запросов
 
     :param location_key: Ключ локации с сайта AccuWeather
     :param days: Количество дней в прогнозе (целое число от одного до пяти)
-    :return: Данные о погоде в формате списка словарей, либо None при ошибке
+    :param as_json: Вернуть прогноз строкой в формате JSON (список объектов по дням)
+    :param service: Сервис AccuWeather (по умолчанию - default_service())
+    :return: Список прогнозов DailyForecast по дням (или строка JSON при as_json = True), либо None при ошибке
     """
     assert 1 <= days <= 5, "Возможно получение прогнозов погоды от 1 до 5 дней, включая концы"
-    forecast_base_url = f"http://dataservice.accuweather.com/forecasts/v1/daily/5day/{location_key}"
-    params = {
-        "apikey": api_key,
-        "language": response_lang,
-        "details": True,
-    }
-    response = requests.get(forecast_base_url, params=params)
-    if response.status_code != 200:
-        print(f"Ошибка при получении прогноза погоды: {response.text}")
+    result = (service or default_service()).get_daily_forecasts(location_key, days)
+    if not result:
         return
-    response_json = response.json()
-    result_array = []
-    for i in range(days):
-        forecast = response_json["DailyForecasts"][i]
-        temperature_data = forecast["Day"]["WetBulbTemperature"]["Average"]
-        humidity_data = forecast["Day"]["RelativeHumidity"]["Average"]
-        wind_speed_data = forecast["Day"]["Wind"]["Speed"]
-        precipitation_probability = forecast["Day"]["PrecipitationProbability"]
-
-        # Перевод температуры из шкалы Фаренгейта в шкалу Цельсия
-        temperature_value = fahrenheit_to_celsius(temperature_data["Value"])
-
-        # Перевод скорости в ветра из мили/ч в км/ч
-        wind_speed_value = miles_to_kilometers(wind_speed_data["Value"])
-        result = {
-            "temperature": temperature_value,
-            "humidity": humidity_data,
-            "wind_speed": wind_speed_value,
-            "precipitation_probability": precipitation_probability,
-        }
-        result_array.append(result)
-
-    return result_array
+    if as_json:
+        return json.dumps([forecast.to_dict() for forecast in result], indent=4)
+    return result
 
 
 def check_bad_weather(temperature: float, humidity: float, wind_speed: float, precipitation_probability: float) -> bool:
@@ -219,3 +513,30 @@ def check_bad_weather(temperature: float, humidity: float, wind_speed: float, pr
         print(repr(e))
         return False
     return False
+
+
+def check_bad_weather_batch(temperature: np.ndarray, humidity: np.ndarray, wind_speed: np.ndarray,
+                            precipitation_probability: np.ndarray) -> np.ndarray:
+    """
+    Векторная версия check_bad_weather: проверяет сразу массивы значений прогноза
+    (например, для всех точек и дней маршрута) и возвращает маску плохой погоды.
+
+    Критерии те же, что и в check_bad_weather. Отсутствующие значения (NaN) и нулевая влажность,
+    как и в скалярной версии, не считаются признаком плохой погоды.
+
+    :param temperature: Температура
+    :param humidity: Влажность
+    :param wind_speed: Скорость ветра
+    :param precipitation_probability: Вероятность осадков
+    :return: Булев массив той же формы, True - погода плохая
+    """
+    temperature, humidity, wind_speed, precipitation_probability = (
+        np.asarray(values, dtype=float) for values in (temperature, humidity, wind_speed, precipitation_probability)
+    )
+    # Сравнения с NaN дают False, поэтому отсутствующие значения отдельно обрабатывать не нужно
+    return (
+        (temperature < 0) | (temperature > 35)
+        | (wind_speed > 50)
+        | (precipitation_probability > 70)
+        | ((humidity != 0) & ((humidity < 30) | (humidity > 80)))
+    )